@@ -1,28 +1,60 @@
 import os
 import sys
+import time
+
+STARTUP_STARTED = time.monotonic()
+
+import atexit
 import json
+import base64
+import hashlib
 import threading
-import time
 import subprocess
-from flask import Flask, request, jsonify, session, send_from_directory
+from flask import Flask, request, jsonify, session, send_from_directory, stream_with_context
 from urllib.parse import urlparse
-from models import db, User, Stream, Log, Assignment, ChatKeyword, FlaggedObject
-from notifications import send_notification
-from detection import visual, audio, chat
+from models import db, User, Stream, Log, LogRollup, Assignment, ChatKeyword, FlaggedObject, upgrade_schema, configure_sqlite
+from models import get_registry_version, bump_registry_version, Job
+import events
+import ingest
+import jobs
+import preview
+import results_store
+import video_analysis
+from log_writer import LogWriter, RetentionJob
+from notifications import send_notification, get_dispatcher
+from monitor import AsyncMonitor, StreamSync
+from detection import visual, audio, chat, capture, motion, registry, loading, tracker
 from functools import wraps
-from datetime import timedelta
+from datetime import datetime, timedelta
 import requests
 from bs4 import BeautifulSoup
 from werkzeug.utils import secure_filename
 import cv2
 from yt_dlp import YoutubeDL
-from vosk import Model as VoskModel, KaldiRecognizer
 
 app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///monitor.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = 'supersecretkey'
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=7)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_size': 10,
+    'max_overflow': 20,
+    'pool_pre_ping': True,
+    'connect_args': {'timeout': 30, 'check_same_thread': False},
+}
+# Event log flushing: larger/longer values mean fewer commits but more events at risk on a crash
+app.config['LOG_FLUSH_SIZE'] = int(os.environ.get('LOG_FLUSH_SIZE', 500))
+app.config['LOG_FLUSH_INTERVAL'] = float(os.environ.get('LOG_FLUSH_INTERVAL', 2.0))
+app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+app.config['LOG_RETENTION_DAYS'] = int(os.environ.get('LOG_RETENTION_DAYS', 30))
+app.config['RESULTS_RETENTION_DAYS'] = results_store.RESULTS_RETENTION_DAYS
+# RUN_DETECTION=0 gives an API-only worker (CRUD, dashboards, logs) that never loads a model;
+# run monitor_worker.py alongside it for detection. PRELOAD_MODELS=1 loads models at startup.
+app.config['RUN_DETECTION'] = os.environ.get('RUN_DETECTION', '1') == '1'
+app.config['PRELOAD_MODELS'] = os.environ.get('PRELOAD_MODELS', '0') == '1'
+# Seconds between checks of the assigned streams; how long the monitor process may lag an API worker's edit
+app.config['STREAM_SYNC_INTERVAL'] = float(os.environ.get('STREAM_SYNC_INTERVAL', 10.0))
 
 # Define folders and allowed extensions
 UPLOAD_FOLDER = 'uploads'
@@ -32,38 +64,82 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
 db.init_app(app)
 
-# Global dictionaries for galleries and audio flags
-# thumbnail_gallery: { video_filename: { object_class: {thumb_filename, video_timestamp, realworld_timestamp} } }
-# audio_flags: { video_filename: { flagged_keyword: {phrase, audio_timestamp, realworld_timestamp} } }
-thumbnail_gallery = {}
-audio_flags = {}
+# Upload processing runs as Job rows picked up by worker.py processes. Job results:
+# visual: { gallery: { object_class: {thumb_filename, video_timestamp, realworld_timestamp} },
+#           timeline: [ {time, class, confidence, box} ] }
+# audio: { flagged_keyword: {phrase, audio_timestamp, realworld_timestamp} }
+# Set JOB_WORKERS to start that many worker processes alongside `python app.py`.
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+app.config['MEDIA_INGEST'] = os.environ.get('MEDIA_INGEST', 'auto')  # 'auto', 'shared' single decode or 'split' jobs
 
-# Global flagged keywords (update from DB)
-flagged_keywords = []
-def update_flagged_keywords():
-    global flagged_keywords
+# Flagged keywords and objects live in detection.registry as one compiled, versioned snapshot.
+# Writes bump RegistryVersion; every process polls that counter and reloads when it moves.
+DEFAULT_KEYWORDS = ["gun", "knife", "hate"]
+
+def read_registry_version():
+    with app.app_context():
+        return get_registry_version()
+
+def load_registry():
     with app.app_context():
-        db.create_all()
-        update_flagged_keywords()
-        keywords = ChatKeyword.query.all()
-        flagged_keywords = [kw.keyword for kw in keywords]
+        version = get_registry_version()
+        keywords = [kw.keyword for kw in ChatKeyword.query.all()]
+        object_thresholds = {obj.object_name: obj.conf_threshold for obj in FlaggedObject.query.all()}
+        return version, keywords, object_thresholds
+
+registry_watcher = registry.RegistryWatcher(read_registry_version, load_registry)
 
-# Initialize Vosk model (ensure you have a Vosk model folder named "model" in your project directory)
-vosk_model = VoskModel("model")
+def update_flagged_keywords():
+    """Reload the registry right away after a write in this process."""
+    registry_watcher.reload()
 
 with app.app_context():
+    configure_sqlite(db.engine, app.config['SQLITE_SYNCHRONOUS'])
     db.create_all()
+    upgrade_schema()
     if not User.query.filter_by(username='admin').first():
         admin_user = User(username='admin', password='admin', role='admin')
         db.session.add(admin_user)
     if not User.query.filter_by(username='agent').first():
         agent_user = User(username='agent', password='agent', role='agent')
         db.session.add(agent_user)
+    # Seed only a brand-new database: every keyword write bumps the version, so an admin who
+    # deleted all keywords does not get the defaults back on the next restart
+    if get_registry_version() == 0 and not ChatKeyword.query.first():
+        for word in DEFAULT_KEYWORDS:
+            db.session.add(ChatKeyword(keyword=word))
+        bump_registry_version()
     db.session.commit()
 
+update_flagged_keywords()
+registry_watcher.start()
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def parse_threshold(value):
+    """Parse an optional confidence threshold; raises ValueError unless it lies in [0, 1]."""
+    if value is None or value == '':
+        return None
+    threshold = float(value)
+    if not 0.0 <= threshold <= 1.0:
+        raise ValueError('Threshold must be between 0 and 1')
+    return threshold
+
+def get_class_thresholds():
+    """Per-class confidence thresholds configured on flagged objects."""
+    thresholds = registry.current().object_thresholds
+    return {name: threshold for name, threshold in thresholds.items() if threshold is not None}
+
+def detection_required(f):
+    """Reject detection endpoints on API-only workers instead of loading models there."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not app.config['RUN_DETECTION']:
+            return jsonify({'message': 'Detection is disabled on this server'}), 503
+        return f(*args, **kwargs)
+    return decorated_function
+
 def login_required(role=None):
     def decorator(f):
         @wraps(f)
@@ -134,6 +210,7 @@ def create_agent():
     new_agent = User(username=username, password=password, role='agent')
     db.session.add(new_agent)
     db.session.commit()
+    invalidate_dashboard_cache()
     return jsonify({'message': 'Agent created successfully', 'agent': {'id': new_agent.id, 'username': new_agent.username}}), 201
 
 @app.route('/api/agents/<int:agent_id>', methods=['PUT'])
@@ -148,6 +225,7 @@ def update_agent(agent_id):
     if 'password' in data and data['password'].strip():
         agent.password = data['password'].strip()
     db.session.commit()
+    invalidate_dashboard_cache()
     return jsonify({'message': 'Agent updated successfully'})
 
 @app.route('/api/agents/<int:agent_id>', methods=['DELETE'])
@@ -158,13 +236,14 @@ def delete_agent(agent_id):
         return jsonify({'message': 'Agent not found'}), 404
     db.session.delete(agent)
     db.session.commit()
+    invalidate_dashboard_cache()
     return jsonify({'message': 'Agent deleted successfully'})
 
 @app.route('/api/streams', methods=['GET'])
 @login_required(role='admin')
 def get_streams():
     streams = Stream.query.all()
-    return jsonify([{'id': stream.id, 'room_url': stream.room_url, 'platform': stream.platform, 'streamer_username': stream.streamer_username} for stream in streams])
+    return jsonify([{'id': stream.id, 'room_url': stream.room_url, 'platform': stream.platform, 'streamer_username': stream.streamer_username, 'conf_threshold': stream.conf_threshold} for stream in streams])
 
 @app.route('/api/streams', methods=['POST'])
 @login_required(role='admin')
@@ -174,6 +253,10 @@ def create_stream():
     platform = data.get('platform', 'Chaturbate').strip()
     if not room_url:
         return jsonify({'message': 'Room URL is required'}), 400
+    try:
+        conf_threshold = parse_threshold(data.get('conf_threshold'))
+    except (TypeError, ValueError):
+        return jsonify({'message': 'Invalid confidence threshold'}), 400
     if platform.lower() == "chaturbate" and "chaturbate.com" not in room_url:
         return jsonify({'message': 'Invalid Chaturbate room URL'}), 400
     elif platform.lower() == "stripchat" and "stripchat.com" not in room_url:
@@ -182,10 +265,11 @@ def create_stream():
     streamer_username = parts[-1] if parts else ''
     if Stream.query.filter_by(room_url=room_url).first():
         return jsonify({'message': 'Stream already exists'}), 400
-    new_stream = Stream(room_url=room_url, platform=platform, streamer_username=streamer_username)
+    new_stream = Stream(room_url=room_url, platform=platform, streamer_username=streamer_username, conf_threshold=conf_threshold)
     db.session.add(new_stream)
     db.session.commit()
-    return jsonify({'message': 'Stream created successfully', 'stream': {'id': new_stream.id, 'room_url': new_stream.room_url, 'platform': new_stream.platform, 'streamer_username': new_stream.streamer_username}}), 201
+    invalidate_dashboard_cache()
+    return jsonify({'message': 'Stream created successfully', 'stream': {'id': new_stream.id, 'room_url': new_stream.room_url, 'platform': new_stream.platform, 'streamer_username': new_stream.streamer_username, 'conf_threshold': new_stream.conf_threshold}}), 201
 
 @app.route('/api/streams/<int:stream_id>', methods=['PUT'])
 @login_required(role='admin')
@@ -206,7 +290,15 @@ def update_stream(stream_id):
         stream.streamer_username = parts[-1] if parts else ''
     if 'platform' in data and data['platform'].strip():
         stream.platform = data['platform'].strip()
+    if 'conf_threshold' in data:
+        try:
+            stream.conf_threshold = parse_threshold(data['conf_threshold'])
+        except (TypeError, ValueError):
+            return jsonify({'message': 'Invalid confidence threshold'}), 400
     db.session.commit()
+    invalidate_dashboard_cache()
+    # The monitor drops the old URL, releases its workers and starts on the new one
+    stream_sync.trigger()
     return jsonify({'message': 'Stream updated successfully'})
 
 @app.route('/api/streams/<int:stream_id>', methods=['DELETE'])
@@ -217,6 +309,8 @@ def delete_stream(stream_id):
         return jsonify({'message': 'Stream not found'}), 404
     db.session.delete(stream)
     db.session.commit()
+    invalidate_dashboard_cache()
+    stream_sync.trigger()
     return jsonify({'message': 'Stream deleted successfully'})
 
 @app.route('/api/keywords', methods=['GET'])
@@ -236,6 +330,7 @@ def create_keyword():
         return jsonify({'message': 'Keyword already exists'}), 400
     new_keyword = ChatKeyword(keyword=keyword)
     db.session.add(new_keyword)
+    bump_registry_version()
     db.session.commit()
     update_flagged_keywords()
     return jsonify({'message': 'Keyword added successfully', 'keyword': {'id': new_keyword.id, 'keyword': new_keyword.keyword}}), 201
@@ -250,6 +345,7 @@ def update_keyword(keyword_id):
         return jsonify({'message': 'Keyword not found'}), 404
     if keyword_text:
         keyword.keyword = keyword_text
+    bump_registry_version()
     db.session.commit()
     update_flagged_keywords()
     return jsonify({'message': 'Keyword updated successfully'})
@@ -261,6 +357,7 @@ def delete_keyword(keyword_id):
     if not keyword:
         return jsonify({'message': 'Keyword not found'}), 404
     db.session.delete(keyword)
+    bump_registry_version()
     db.session.commit()
     update_flagged_keywords()
     return jsonify({'message': 'Keyword deleted successfully'})
@@ -269,7 +366,7 @@ def delete_keyword(keyword_id):
 @login_required(role='admin')
 def get_objects():
     objects = FlaggedObject.query.all()
-    return jsonify([{'id': obj.id, 'object_name': obj.object_name} for obj in objects])
+    return jsonify([{'id': obj.id, 'object_name': obj.object_name, 'conf_threshold': obj.conf_threshold} for obj in objects])
 
 @app.route('/api/objects', methods=['POST'])
 @login_required(role='admin')
@@ -278,12 +375,18 @@ def create_object():
     object_name = data.get('object_name', '').strip()
     if not object_name:
         return jsonify({'message': 'Object name required'}), 400
+    try:
+        conf_threshold = parse_threshold(data.get('conf_threshold'))
+    except (TypeError, ValueError):
+        return jsonify({'message': 'Invalid confidence threshold'}), 400
     if FlaggedObject.query.filter_by(object_name=object_name).first():
         return jsonify({'message': 'Object already exists'}), 400
-    new_object = FlaggedObject(object_name=object_name)
+    new_object = FlaggedObject(object_name=object_name, conf_threshold=conf_threshold)
     db.session.add(new_object)
+    bump_registry_version()
     db.session.commit()
-    return jsonify({'message': 'Flagged object added successfully', 'object': {'id': new_object.id, 'object_name': new_object.object_name}}), 201
+    update_flagged_keywords()
+    return jsonify({'message': 'Flagged object added successfully', 'object': {'id': new_object.id, 'object_name': new_object.object_name, 'conf_threshold': new_object.conf_threshold}}), 201
 
 @app.route('/api/objects/<int:object_id>', methods=['PUT'])
 @login_required(role='admin')
@@ -295,7 +398,14 @@ def update_object(object_id):
         return jsonify({'message': 'Object not found'}), 404
     if object_name:
         obj.object_name = object_name
+    if 'conf_threshold' in data:
+        try:
+            obj.conf_threshold = parse_threshold(data['conf_threshold'])
+        except (TypeError, ValueError):
+            return jsonify({'message': 'Invalid confidence threshold'}), 400
+    bump_registry_version()
     db.session.commit()
+    update_flagged_keywords()
     return jsonify({'message': 'Flagged object updated successfully'})
 
 @app.route('/api/objects/<int:object_id>', methods=['DELETE'])
@@ -305,49 +415,212 @@ def delete_object(object_id):
     if not obj:
         return jsonify({'message': 'Object not found'}), 404
     db.session.delete(obj)
+    bump_registry_version()
     db.session.commit()
+    update_flagged_keywords()
     return jsonify({'message': 'Flagged object deleted successfully'})
 
 # --- Dashboard endpoints ---
+DASHBOARD_CACHE_TTL = 5.0  # Seconds a dashboard snapshot is served before it is rebuilt
+DASHBOARD_CACHE_ENTRIES = 256  # Snapshots kept at most; keys include the agent and page, so they are open-ended
+dashboard_cache = {}
+dashboard_cache_generation = 0
+dashboard_cache_lock = threading.Lock()
+
+def invalidate_dashboard_cache():
+    """Drop every dashboard snapshot; called by the stream, agent and assignment writes."""
+    global dashboard_cache_generation
+    with dashboard_cache_lock:
+        dashboard_cache.clear()
+        dashboard_cache_generation += 1
+
+def cached_json_response(key, build):
+    """Serve build() as JSON from a short-TTL snapshot, with an ETag so unchanged polls get a 304."""
+    now = time.monotonic()
+    with dashboard_cache_lock:
+        entry = dashboard_cache.get(key)
+        generation = dashboard_cache_generation
+    if entry is None or entry[0] < now:
+        body = json.dumps(build()).encode()
+        entry = (now + DASHBOARD_CACHE_TTL, body, hashlib.sha1(body).hexdigest())
+        with dashboard_cache_lock:
+            # Don't store a snapshot built from data that a write has since replaced
+            if generation == dashboard_cache_generation:
+                for stale in [k for k, (expires, _, _) in dashboard_cache.items() if expires < now]:
+                    del dashboard_cache[stale]
+                dashboard_cache.pop(key, None)
+                if len(dashboard_cache) >= DASHBOARD_CACHE_ENTRIES:
+                    # Dicts keep insertion order, so this is the snapshot stored longest ago
+                    del dashboard_cache[next(iter(dashboard_cache))]
+                dashboard_cache[key] = entry
+    response = app.response_class(entry[1], mimetype='application/json')
+    response.set_etag(entry[2])
+    return response.make_conditional(request)
+
+def pagination_args():
+    """Optional ?page=&per_page= arguments; returns (offset, limit) with limit None for everything."""
+    per_page = request.args.get('per_page', type=int)
+    page = max(request.args.get('page', 1, type=int), 1)
+    if not per_page:
+        return 0, None
+    per_page = max(1, min(per_page, 1000))
+    return (page - 1) * per_page, per_page
+
 @app.route('/api/dashboard', methods=['GET'])
 @login_required(role='admin')
 def get_dashboard():
-    streams = Stream.query.all()
-    dashboard_data = []
-    for stream in streams:
-        assignment = Assignment.query.filter_by(stream_id=stream.id).first()
-        dashboard_data.append({
-            "stream_id": stream.id,
-            "room_url": stream.room_url,
-            "platform": stream.platform,
-            "streamer_username": stream.streamer_username,
-            "agent_id": assignment.agent_id if assignment else None,
-            "agent_username": assignment.user.username if assignment else "Unassigned"
-        })
-    ongoing_streams = len(dashboard_data)
-    return jsonify({"ongoing_streams": ongoing_streams, "streams": dashboard_data})
+    offset, limit = pagination_args()
+
+    def build():
+        # The first assignment of each stream, joined in one query instead of one per stream
+        first_assignment = db.session.query(
+            Assignment.stream_id, db.func.min(Assignment.id).label('assignment_id')
+        ).group_by(Assignment.stream_id).subquery()
+        query = db.session.query(Stream, Assignment.agent_id, User.username) \
+            .outerjoin(first_assignment, first_assignment.c.stream_id == Stream.id) \
+            .outerjoin(Assignment, Assignment.id == first_assignment.c.assignment_id) \
+            .outerjoin(User, User.id == Assignment.agent_id) \
+            .order_by(Stream.id)
+        rows = query.offset(offset).limit(limit).all()
+        dashboard_data = []
+        for stream, agent_id, agent_username in rows:
+            dashboard_data.append({
+                "stream_id": stream.id,
+                "room_url": stream.room_url,
+                "platform": stream.platform,
+                "streamer_username": stream.streamer_username,
+                "agent_id": agent_id,
+                "agent_username": agent_username if agent_id else "Unassigned"
+            })
+        ongoing_streams = Stream.query.count() if limit else len(dashboard_data)
+        return {"ongoing_streams": ongoing_streams, "streams": dashboard_data}
+
+    return cached_json_response(('admin', offset, limit), build)
 
 @app.route('/api/agent/dashboard', methods=['GET'])
 @login_required(role='agent')
 def get_agent_dashboard():
     agent_id = session['user_id']
-    assignments = Assignment.query.filter_by(agent_id=agent_id).all()
-    dashboard_data = []
-    for assignment in assignments:
-        stream = assignment.stream
-        if stream:
+    offset, limit = pagination_args()
+
+    def build():
+        query = Stream.query.join(Assignment, Assignment.stream_id == Stream.id) \
+            .filter(Assignment.agent_id == agent_id) \
+            .order_by(Assignment.id)
+        streams = query.offset(offset).limit(limit).all()
+        dashboard_data = []
+        for stream in streams:
             dashboard_data.append({
                 "stream_id": stream.id,
                 "room_url": stream.room_url,
                 "platform": stream.platform,
                 "streamer_username": stream.streamer_username,
             })
-    ongoing_streams = len(dashboard_data)
-    return jsonify({"ongoing_streams": ongoing_streams, "assignments": dashboard_data})
+        ongoing_streams = query.count() if limit else len(dashboard_data)
+        return {"ongoing_streams": ongoing_streams, "assignments": dashboard_data}
+
+    return cached_json_response(('agent', agent_id, offset, limit), build)
+
+# --- Event log endpoints ---
+LOGS_PAGE_SIZE = 100
+LOGS_MAX_PAGE_SIZE = 1000
+
+def encode_log_cursor(log):
+    raw = f"{log.timestamp.isoformat()}|{log.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_log_cursor(cursor):
+    timestamp, log_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return datetime.fromisoformat(timestamp), int(log_id)
+
+def filtered_logs(model, time_column):
+    """Apply the room_url / event_type / since / until query filters shared by the log endpoints."""
+    query = model.query
+    if request.args.get('room_url'):
+        query = query.filter(model.room_url == request.args['room_url'])
+    if request.args.get('event_type'):
+        query = query.filter(model.event_type == request.args['event_type'])
+    if request.args.get('since'):
+        query = query.filter(time_column >= datetime.fromisoformat(request.args['since']))
+    if request.args.get('until'):
+        query = query.filter(time_column < datetime.fromisoformat(request.args['until']))
+    return query
+
+def serialize_log(log):
+    return {'id': log.id, 'timestamp': log.timestamp.isoformat(), 'room_url': log.room_url, 'event_type': log.event_type}
+
+@app.route('/api/logs', methods=['GET'])
+@login_required()
+def get_logs():
+    """Newest-first event log with keyset pagination; format=ndjson streams every matching row."""
+    try:
+        query = filtered_logs(Log, Log.timestamp)
+        # A limit below 1 would hand out a cursor that skips rows (0) or scan the whole table (negative)
+        limit = max(1, min(int(request.args.get('limit', LOGS_PAGE_SIZE)), LOGS_MAX_PAGE_SIZE))
+        cursor = request.args.get('cursor')
+        if cursor:
+            timestamp, log_id = decode_log_cursor(cursor)
+            query = query.filter(db.or_(Log.timestamp < timestamp,
+                                        db.and_(Log.timestamp == timestamp, Log.id < log_id)))
+    except ValueError:
+        return jsonify({'message': 'Invalid filter or cursor'}), 400
+    query = query.order_by(Log.timestamp.desc(), Log.id.desc())
+    if request.args.get('format') == 'ndjson':
+        def generate():
+            for log in query.yield_per(1000):
+                yield json.dumps(serialize_log(log)) + "\n"
+        return app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson')
+    logs = query.limit(limit + 1).all()
+    next_cursor = encode_log_cursor(logs[limit - 1]) if len(logs) > limit else None
+    return jsonify({'logs': [serialize_log(log) for log in logs[:limit]], 'next_cursor': next_cursor})
+
+@app.route('/api/logs/hourly', methods=['GET'])
+@login_required()
+def get_log_rollups():
+    """Per-hour counts for events older than the retention period."""
+    try:
+        query = filtered_logs(LogRollup, LogRollup.hour)
+    except ValueError:
+        return jsonify({'message': 'Invalid filter'}), 400
+    rollups = query.order_by(LogRollup.hour.desc()).limit(LOGS_MAX_PAGE_SIZE).all()
+    return jsonify({'hourly': [{'hour': r.hour.isoformat(), 'room_url': r.room_url, 'event_type': r.event_type, 'count': r.count}
+                               for r in rollups]})
+
+# --- Live event stream (Server-Sent Events) ---
+@app.route('/api/events', methods=['GET'])
+@login_required()
+def event_stream():
+    """Push alerts, job progress, new thumbnails and audio flags instead of polling.
+
+    Optional filters: topics=alert,job,thumbnail,audio_flag, room=<room url>, video=<filename>.
+    Reconnecting clients resume from the Last-Event-ID header (or last_event_id parameter)."""
+    topics = {t for t in request.args.get('topics', '').split(',') if t} or None
+    if topics and not topics <= set(events.TOPICS):
+        return jsonify({'message': f"Unknown topics: {', '.join(sorted(topics - set(events.TOPICS)))}"}), 400
+    keys = {k for k in (request.args.get('room'), request.args.get('video')) if k} or None
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    change_feed.start()
+    response = app.response_class(events.broadcaster.listen(topics, keys, last_event_id), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Stop reverse proxies from holding events back
+    return response
+
+# --- Detection statistics ---
+@app.route('/api/detection/stats', methods=['GET'])
+@login_required(role='admin')
+def get_detection_stats():
+    return jsonify({'inference': visual.engine.stats, 'motion_gate': motion.get_stats(), 'monitor': stream_monitor.stats(),
+                    'notifications': get_dispatcher().stats(), 'log_writer': log_writer.stats,
+                    'chat': chat.pipeline.stats, 'preview': preview.get_stats(),
+                    'results_cache': results_store.cache.get_stats(), 'thumbnails': results_store.thumbnails.stats,
+                    'events': dict(events.broadcaster.stats, subscribers=events.broadcaster.subscribers),
+                    'audio': dict(audio.pipeline.stats, recognizers=audio.recognizers.stats),
+                    'model_load_seconds': loading.load_times})
 
 # --- Endpoint for visual detection via file upload (single frame test) ---
 @app.route('/api/test/visual', methods=['POST'])
 @login_required(role='admin')
+@detection_required
 def test_visual():
     if 'video' not in request.files:
         return jsonify({'message': 'No video file provided'}), 400
@@ -364,10 +637,13 @@ def test_visual():
         cap.release()
         if not ret:
             return jsonify({'message': 'Could not read video file'}), 400
-        threshold = float(request.args.get('threshold', 0.5))
-        visual.CONF_THRESHOLD = threshold
-        results = visual.detect_frame(frame)
         os.remove(file_path)
+        try:
+            threshold = parse_threshold(request.args.get('threshold', visual.CONF_THRESHOLD))
+        except ValueError:
+            return jsonify({'message': 'Invalid threshold'}), 400
+        # The threshold travels with this call only; other requests and monitors are unaffected
+        results = visual.detect_frame(frame, threshold, get_class_thresholds())
         return jsonify({'results': results})
     else:
         return jsonify({'message': 'Invalid file format'}), 400
@@ -375,29 +651,16 @@ def test_visual():
 # --- Endpoint for streaming an uploaded video with real-time annotation (MJPEG) ---
 @app.route('/api/test/visual/stream/<filename>', methods=['GET'])
 @login_required(role='admin')
+@detection_required
 def stream_uploaded_video(filename):
     file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
     if not os.path.exists(file_path):
         return jsonify({'message': 'File not found'}), 404
+    broadcaster = preview.get_broadcaster(file_path, get_class_thresholds)
     def generate():
-        cap = cv2.VideoCapture(file_path)
-        if not cap.isOpened():
-            yield "data: " + json.dumps({"error": "Could not open video file"}) + "\n\n"
-            return
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                continue
-            annotated = visual.detect_and_annotate_frame(frame)
-            ret, buffer = cv2.imencode('.jpg', annotated)
-            if not ret:
-                continue
-            frame_bytes = buffer.tobytes()
+        for jpeg in broadcaster.frames():
             yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-            time.sleep(0.03)
-        cap.release()
+                   b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
     return app.response_class(generate(), mimetype='multipart/x-mixed-replace; boundary=frame')
 
 # --- Endpoint for uploading a video for real-time visual detection and gallery creation ---
@@ -416,90 +679,120 @@ def upload_visual_video():
         os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
         os.makedirs(THUMBNAILS_FOLDER, exist_ok=True)
         file.save(file_path)
-        # Initialize galleries for this video
-        thumbnail_gallery[unique_filename] = {}
-        audio_flags[unique_filename] = {}
-        threading.Thread(target=process_uploaded_video, args=(file_path, unique_filename), daemon=True).start()
-        threading.Thread(target=process_audio, args=(file_path, unique_filename), daemon=True).start()
-        video_url = f"/uploads/{unique_filename}"
-        gallery_url = f"/api/test/visual/thumbnails/{unique_filename}"
-        audio_flags_url = f"/api/test/audio/flags/{unique_filename}"
-        return jsonify({'message': 'File uploaded successfully', 'video_url': video_url, 'gallery_url': gallery_url, 'audio_flags_url': audio_flags_url})
+        response = enqueue_video_jobs(file_path, unique_filename)
+        response['message'] = 'File uploaded successfully'
+        return jsonify(response)
     else:
         return jsonify({'message': 'Invalid file format'}), 400
 
-def process_uploaded_video(video_path, video_filename):
-    """Process the uploaded video to extract unique object thumbnails with timestamps."""
+def enqueue_video_jobs(file_path, video_filename):
+    """Queue the analysis jobs for a video and return the URLs to follow them.
+
+    'shared' decodes the file once for both detectors in one job, halving the I/O but running
+    the visual side on a single decode stream. 'split' runs separate visual and audio jobs,
+    which lets the visual side analyse time segments in parallel. 'auto' (the default) shares
+    the decode unless the video is long enough to be split into segments across processes."""
+    mode = app.config['MEDIA_INGEST']
+    if mode == 'auto':
+        parallel = (video_analysis.ANALYSIS_PROCESSES > 1
+                    and video_duration(file_path) > video_analysis.SEGMENT_SECONDS)
+        mode = 'split' if parallel else 'shared'
+    if mode == 'shared':
+        queued = [jobs.enqueue('media', video_filename, file_path)]
+    else:
+        queued = [jobs.enqueue('visual', video_filename, file_path), jobs.enqueue('audio', video_filename, file_path)]
+    return {
+        'video_url': f"/uploads/{video_filename}",
+        'gallery_url': f"/api/test/visual/thumbnails/{video_filename}",
+        'audio_flags_url': f"/api/test/audio/flags/{video_filename}",
+        'jobs': [f"/api/jobs/{job.id}" for job in queued]
+    }
+
+def video_duration(video_path):
     cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        return
-    frame_count = 0
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        frame_count += 1
-        if frame_count % 30 == 0:
-            video_timestamp = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
-            real_time_str = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-            detections = visual.extract_detections(frame)
-            for i, det in enumerate(detections):
-                obj_class = det['class']
-                if obj_class not in thumbnail_gallery[video_filename]:
-                    x1, y1, x2, y2 = det['box']
-                    cropped = frame[y1:y2, x1:x2]
-                    if cropped.size == 0:
-                        continue
-                    thumb = cv2.resize(cropped, (100, 100))
-                    thumb_filename = f"{video_filename}_{frame_count}_{i}.jpg"
-                    thumb_path = os.path.join(THUMBNAILS_FOLDER, thumb_filename)
-                    cv2.imwrite(thumb_path, thumb)
-                    thumbnail_gallery[video_filename][obj_class] = {
-                        "thumb_filename": thumb_filename,
-                        "video_timestamp": video_timestamp,
-                        "realworld_timestamp": real_time_str
-                    }
-        if frame_count > 300:
-            break
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frames = cap.get(cv2.CAP_PROP_FRAME_COUNT)
     cap.release()
+    return frames / fps if fps > 0 else 0.0
+
+def process_uploaded_video(video_path, video_filename, report):
+    """Analyse the whole uploaded video: one thumbnail per object class plus a timeline of every detection."""
+    return video_analysis.analyze_video(video_path, THUMBNAILS_FOLDER, report)
 
-def process_audio(video_path, video_filename):
+def process_audio(video_path, video_filename, report):
     """Process audio from the video using Vosk for real-time transcription and keyword detection."""
-    global audio_flags
-    audio_flags[video_filename] = {}
+    duration = video_duration(video_path)
     cmd = [
         "ffmpeg", "-loglevel", "quiet", "-i", video_path,
         "-ar", "16000", "-ac", "1", "-f", "s16le", "-"
     ]
     proc = subprocess.Popen(cmd, stdout=subprocess.PIPE)
-    rec = KaldiRecognizer(vosk_model, 16000)
-    while True:
-        data = proc.stdout.read(4000)
-        if len(data) == 0:
-            break
-        if rec.AcceptWaveform(data):
-            result_json = rec.Result()
-            result = json.loads(result_json)
-            if "result" in result and len(result["result"]) > 0:
-                phrase = " ".join([w["word"] for w in result["result"]])
-                timestamp = result["result"][0]["start"]
-                real_time_str = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-                for keyword in flagged_keywords:
-                    if keyword.lower() in phrase.lower():
-                        if keyword not in audio_flags[video_filename]:
-                            audio_flags[video_filename][keyword] = {
-                                "phrase": phrase,
-                                "audio_timestamp": timestamp,
-                                "realworld_timestamp": real_time_str
-                            }
-    proc.stdout.close()
-    proc.wait()
+    flagger = audio.TranscriptFlagger()
+    bytes_read = 0
+    try:
+        while True:
+            data = proc.stdout.read(audio.CHUNK_BYTES)
+            if len(data) == 0:
+                break
+            bytes_read += len(data)
+            flagger.feed(data)
+            if not report(bytes_read / audio.BYTES_PER_SECOND / duration if duration else 0.0, flagger.flags):
+                proc.kill()
+                break
+    finally:
+        proc.stdout.close()
+        proc.wait()
+    return flagger.close()
+
+def process_media(video_path, video_filename, report):
+    """Demux the video once and run visual analysis and transcription side by side on the shared decode."""
+    media = ingest.MediaIngest(video_path, video_analysis.SAMPLE_FPS)
+    analyzer = video_analysis.FrameAnalyzer(THUMBNAILS_FOLDER)
+    flagger = audio.TranscriptFlagger()
+
+    def partial_result(metrics):
+        return {'visual': analyzer.result(), 'audio': dict(flagger.flags), 'metrics': metrics}
+
+    def on_progress(metrics):
+        progress = min(metrics['video']['progress'], metrics['audio']['progress'])
+        if not report(progress, partial_result(metrics)):
+            media.stop()
+
+    try:
+        metrics = media.run(lambda timestamp, frame: analyzer.add(timestamp, frame, media.scale),
+                            lambda offset, pcm: flagger.feed(pcm), on_progress)
+    finally:
+        flagger.close()
+    return {'visual': analyzer.finish(), 'audio': flagger.flags, 'metrics': metrics}
+
+JOB_HANDLERS = {'visual': process_uploaded_video, 'audio': process_audio, 'media': process_media}
+
+# --- Job status endpoints ---
+@app.route('/api/jobs/<int:job_id>', methods=['GET'])
+@login_required(role='admin')
+def get_job(job_id):
+    job = db.session.get(Job, job_id)
+    if not job:
+        return jsonify({'message': 'Job not found'}), 404
+    data = jobs.serialize_job(job)
+    data['result'] = results_store.load_result(job) or None
+    return jsonify(data)
+
+@app.route('/api/jobs/<int:job_id>/cancel', methods=['POST'])
+@login_required(role='admin')
+def cancel_job(job_id):
+    job = db.session.get(Job, job_id)
+    if not job:
+        return jsonify({'message': 'Job not found'}), 404
+    jobs.cancel(job)
+    return jsonify({'message': 'Cancellation requested', 'job': jobs.serialize_job(job)})
 
 # --- Endpoint for listing thumbnails (gallery) ---
 @app.route('/api/test/visual/thumbnails/<video_filename>', methods=['GET'])
 @login_required(role='admin')
 def list_thumbnails(video_filename):
-    thumbs_dict = thumbnail_gallery.get(video_filename, {})
+    job, result = jobs.latest_result(video_filename, 'visual')
+    thumbs_dict = result.get('gallery', {})
     results = []
     for obj_class, metadata in thumbs_dict.items():
         results.append({
@@ -508,14 +801,22 @@ def list_thumbnails(video_filename):
             "video_timestamp": metadata["video_timestamp"],
             "realworld_timestamp": metadata["realworld_timestamp"]
         })
-    return jsonify({"thumbnails": results})
+    return jsonify({"thumbnails": results, "status": job.status if job else None})
+
+# --- Endpoint for the full detection timeline of an uploaded video ---
+@app.route('/api/test/visual/timeline/<video_filename>', methods=['GET'])
+@login_required(role='admin')
+def get_visual_timeline(video_filename):
+    job, result = jobs.latest_result(video_filename, 'visual')
+    return jsonify({"timeline": result.get('timeline', []), "tracks": result.get('tracks', []),
+                    "status": job.status if job else None, "progress": job.progress if job else None})
 
 # --- Endpoint for listing flagged audio transcriptions ---
 @app.route('/api/test/audio/flags/<video_filename>', methods=['GET'])
 @login_required(role='admin')
 def get_audio_flags(video_filename):
-    flags = audio_flags.get(video_filename, {})
-    return jsonify({"audio_flags": flags})
+    job, flags = jobs.latest_result(video_filename, 'audio')
+    return jsonify({"audio_flags": flags, "status": job.status if job else None})
 
 # --- Endpoint for processing a YouTube video URL ---
 @app.route('/api/test/youtube/upload', methods=['POST'])
@@ -540,19 +841,9 @@ def upload_youtube_video():
     except Exception as e:
         return jsonify({'message': f'Error downloading YouTube video: {str(e)}'}), 500
     os.makedirs(THUMBNAILS_FOLDER, exist_ok=True)
-    thumbnail_gallery[unique_filename] = {}
-    audio_flags[unique_filename] = {}
-    threading.Thread(target=process_uploaded_video, args=(file_path, unique_filename), daemon=True).start()
-    threading.Thread(target=process_audio, args=(file_path, unique_filename), daemon=True).start()
-    video_url = f"/uploads/{unique_filename}"
-    gallery_url = f"/api/test/visual/thumbnails/{unique_filename}"
-    audio_flags_url = f"/api/test/audio/flags/{unique_filename}"
-    return jsonify({
-        'message': 'YouTube video processed successfully',
-        'video_url': video_url,
-        'gallery_url': gallery_url,
-        'audio_flags_url': audio_flags_url
-    })
+    response = enqueue_video_jobs(file_path, unique_filename)
+    response['message'] = 'YouTube video processed successfully'
+    return jsonify(response)
 
 # --- Scraper Endpoint ---
 @app.route('/api/scrape', methods=['POST'])
@@ -581,38 +872,73 @@ def scrape_chaturbate():
         return jsonify({'message': f'Error scraping URL: {str(e)}'}), 500
 
 # --- Background monitoring for assigned streams ---
-def monitor_stream(stream_url):
+def detect_visual(stream_url):
     with app.app_context():
-        while True:
-            visual_result = visual.detect(stream_url)
-            audio_result = audio.detect(stream_url)
-            chat_result = chat.detect(stream_url)
-            events = []
-            if visual_result:
-                events.append(('visual', visual_result))
-            if audio_result:
-                events.append(('audio', audio_result))
-            if chat_result:
-                events.append(('chat', chat_result))
-            for event_type, result in events:
-                log = Log(room_url=stream_url, event_type=event_type)
-                db.session.add(log)
-                db.session.commit()
-                send_notification(f"{event_type} alert on {stream_url}: {result}")
-            time.sleep(10)
+        stream = Stream.query.filter_by(room_url=stream_url).first()
+        conf_threshold = stream.conf_threshold if stream else None
+        return visual.detect(stream_url, conf_threshold, get_class_thresholds())
+
+log_writer = LogWriter(app, app.config['LOG_FLUSH_SIZE'], app.config['LOG_FLUSH_INTERVAL'])
+log_retention = RetentionJob(app, app.config['LOG_RETENTION_DAYS'])
+change_feed = events.ChangeFeed(app, events.broadcaster)
+results_retention = results_store.ResultsRetentionJob(app, THUMBNAILS_FOLDER, app.config['RESULTS_RETENTION_DAYS'])
+
+def record_events(stream_url, events):
+    for event_type, _ in events:
+        log_writer.write(stream_url, event_type)
+
+def release_stream(stream_url):
+    """Stop a stream's capture, audio and chat workers and forget its detector state."""
+    capture.stop_worker(stream_url)
+    motion.remove_gate(stream_url)
+    chat.pipeline.unwatch(stream_url)
+    audio.pipeline.unwatch(stream_url)
+    tracker.remove_tracker(stream_url)
+
+stream_monitor = AsyncMonitor(
+    {'visual': detect_visual, 'audio': audio.detect, 'chat': chat.detect},
+    record_events,
+    send_notification,
+    on_remove=release_stream
+)
+
+def monitored_stream_urls():
+    """Room URLs of every assigned stream."""
+    with app.app_context():
+        assignments = Assignment.query.all()
+        return set([a.stream.room_url for a in assignments if a.stream])
+
+stream_sync = StreamSync(stream_monitor, monitored_stream_urls, app.config['STREAM_SYNC_INTERVAL'])
 
 def start_monitoring():
-    assignments = Assignment.query.all()
-    stream_urls = list(set([a.stream.room_url for a in assignments if a.stream]))
-    for url in stream_urls:
-        t = threading.Thread(target=monitor_stream, args=(url,))
-        t.daemon = True
-        t.start()
+    log_writer.start()
+    log_retention.start()
+    results_retention.start()
+    stream_monitor.start()
+    stream_sync.start()
+    # atexit runs in reverse order: stop the monitors first, then write out what they logged
+    atexit.register(log_writer.flush)
+    atexit.register(stream_monitor.stop)
+    atexit.register(stream_sync.stop)
+
+def preload_models():
+    visual.get_model()
+    audio.get_vosk_model()
+    chat.get_nlp()
+
+if app.config['RUN_DETECTION'] and app.config['PRELOAD_MODELS']:
+    preload_models()
+print(f"Startup took {time.monotonic() - STARTUP_STARTED:.2f}s "
+      f"(detection {'enabled' if app.config['RUN_DETECTION'] else 'disabled'}, models loaded: {loading.load_times or 'none'})")
 
 # --- Main ---
 if __name__ == '__main__':
-    with app.app_context():
-      #  db.create_all()
-      #  update_flagged_keywords()
-        start_monitoring()
+    if app.config['RUN_DETECTION']:
+        with app.app_context():
+            start_monitoring()
+        if app.config['JOB_WORKERS']:
+            worker_dir = os.path.dirname(os.path.abspath(__file__))
+            workers = subprocess.Popen([sys.executable, os.path.join(worker_dir, 'worker.py'),
+                                        '--processes', str(app.config['JOB_WORKERS'])])
+            atexit.register(workers.terminate)
     app.run(host='0.0.0.0', port=5000)
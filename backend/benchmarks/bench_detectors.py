@@ -0,0 +1,103 @@
+"""Compare detector backends on the same frames: latency, frames per second and agreement with a reference.
+
+Usage: python benchmarks/bench_detectors.py video.mp4 [--backends torch onnx onnx-int8] [--frames 100]
+                                            [--input-size 640] [--threads 4] [--conf 0.5]
+
+The first backend is the reference; for the others, recall and precision count a box as matching
+when a reference box of the same class overlaps it with IoU >= 0.5.
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+# Import the backends module directly so the benchmark doesn't start the detection pipelines
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'detection'))
+import backends
+
+def sample_frames(video_path, count):
+    cap = cv2.VideoCapture(video_path)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or count
+    frames = []
+    for index in np.linspace(0, max(total - 1, 0), count).astype(int):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, int(index))
+        ret, frame = cap.read()
+        if ret:
+            frames.append(frame)
+    cap.release()
+    return frames
+
+def make_backend(name, input_size, threads):
+    if name == 'onnx-int8':
+        return backends.create('onnx', input_size=input_size, threads=threads, int8=True)
+    return backends.create(name, input_size=input_size, threads=threads)
+
+def iou(box, boxes):
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return intersection / np.maximum(area + areas - intersection, 1e-9)
+
+def count_matches(reference, candidate, threshold=0.5):
+    """Greedy one-to-one matching of candidate boxes to same-class reference boxes."""
+    matched = 0
+    used = np.zeros(len(reference), dtype=bool)
+    for row in candidate[np.argsort(-candidate[:, 4])]:
+        same_class = (reference[:, 5] == row[5]) & ~used
+        if not same_class.any():
+            continue
+        overlaps = np.where(same_class, iou(row[:4], reference[:, :4]), 0.0)
+        best = int(overlaps.argmax())
+        if overlaps[best] >= threshold:
+            used[best] = True
+            matched += 1
+    return matched
+
+def run(backend, frames, conf):
+    backend.infer(frames[:1], conf)  # Warm-up: first call allocates and compiles
+    latencies = []
+    outputs = []
+    for frame in frames:
+        started = time.perf_counter()
+        outputs.append(backend.infer([frame], conf)[0])
+        latencies.append(time.perf_counter() - started)
+    return outputs, np.array(latencies)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('video')
+    parser.add_argument('--backends', nargs='+', default=['torch', 'onnx'])
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--input-size', type=int, default=backends.DETECTOR_INPUT_SIZE)
+    parser.add_argument('--threads', type=int, default=backends.DETECTOR_THREADS)
+    parser.add_argument('--conf', type=float, default=0.5)
+    args = parser.parse_args()
+
+    frames = sample_frames(args.video, args.frames)
+    print(f"{len(frames)} frames from {args.video}, input size {args.input_size}, threads {args.threads or 'default'}")
+    reference = None
+    for name in args.backends:
+        backend = make_backend(name, args.input_size, args.threads)
+        outputs, latencies = run(backend, frames, args.conf)
+        line = (f"{name:10s} mean {latencies.mean() * 1000:7.1f} ms  p95 {np.percentile(latencies, 95) * 1000:7.1f} ms"
+                f"  {len(frames) / latencies.sum():6.1f} fps  {sum(len(o) for o in outputs)} boxes")
+        if reference is None:
+            reference = outputs
+            line += "  (reference)"
+        else:
+            matched = sum(count_matches(r, o) for r, o in zip(reference, outputs))
+            reference_boxes = sum(len(r) for r in reference)
+            candidate_boxes = sum(len(o) for o in outputs)
+            line += (f"  recall {matched / reference_boxes if reference_boxes else 1.0:.3f}"
+                     f"  precision {matched / candidate_boxes if candidate_boxes else 1.0:.3f}")
+        print(line)
+
+if __name__ == '__main__':
+    main()
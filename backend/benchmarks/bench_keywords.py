@@ -0,0 +1,60 @@
+"""Compare the Aho-Corasick keyword matcher with the old per-keyword substring scan.
+
+Usage: python benchmarks/bench_keywords.py [--keywords 10000] [--words 5000] [--transcripts 20]
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+# Import the matcher module directly so the benchmark doesn't load the detection models
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'detection'))
+from keywords import KeywordMatcher
+
+def random_word(rng):
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 10)))
+
+def naive_scan(keywords, phrase):
+    found = set()
+    for keyword in keywords:
+        if keyword.lower() in phrase.lower():
+            found.add(keyword)
+    return found
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--keywords', type=int, default=10000)
+    parser.add_argument('--words', type=int, default=5000, help='words per transcript')
+    parser.add_argument('--transcripts', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    keywords = [random_word(rng) for _ in range(args.keywords)]
+    keywords += [f"{random_word(rng)} {random_word(rng)}" for _ in range(args.keywords // 10)]
+    vocabulary = [random_word(rng) for _ in range(20000)] + keywords[:200]
+    transcripts = [' '.join(rng.choice(vocabulary) for _ in range(args.words)) for _ in range(args.transcripts)]
+    total_chars = sum(len(t) for t in transcripts)
+
+    started = time.perf_counter()
+    matcher = KeywordMatcher(keywords)
+    build_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    matches = sum(len(matcher.find_all(t)) for t in transcripts)
+    automaton_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    naive_hits = sum(len(naive_scan(keywords, t)) for t in transcripts)
+    naive_time = time.perf_counter() - started
+
+    print(f"{len(keywords)} keywords, {args.transcripts} transcripts, {total_chars} characters")
+    print(f"automaton build:  {build_time * 1000:.1f} ms")
+    print(f"automaton match:  {automaton_time * 1000:.1f} ms ({matches} word-bounded matches)")
+    print(f"substring scan:   {naive_time * 1000:.1f} ms ({naive_hits} substring hits)")
+    print(f"speedup:          {naive_time / automaton_time:.1f}x")
+
+if __name__ == '__main__':
+    main()
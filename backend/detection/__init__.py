@@ -1,2 +1,2 @@
-from . import visual, audio, chat
+from . import loading, capture, motion, keywords, registry, visual, audio, chat, tracker
 
@@ -1,8 +1,332 @@
+import bisect
+import json
+import os
+import queue
 import random
+import subprocess
+import threading
+import time
+import zlib
+from collections import defaultdict, deque
+
+import numpy as np
+
+from . import registry
+from .loading import load_once
+
+# Path to the Vosk model folder (the repo ships a small English model in "model")
+VOSK_MODEL_PATH = os.environ.get('VOSK_MODEL_PATH', 'model')
+SAMPLE_RATE = 16000
+BYTES_PER_SECOND = SAMPLE_RATE * 2  # 16 kHz mono s16le
+CHUNK_MS = int(os.environ.get('AUDIO_CHUNK_MS', 200))  # Smaller chunks lower latency but cost more calls
+CHUNK_BYTES = BYTES_PER_SECOND * CHUNK_MS // 1000
+ASR_WORKERS = int(os.environ.get('AUDIO_ASR_WORKERS', 2))  # Threads running Vosk for all rooms
+MAX_RECOGNIZERS = 16       # Idle recognizers kept for reuse
+QUEUE_SIZE = 500           # Voiced chunks waiting per ASR worker; beyond this chunks are dropped
+VAD_MIN_RMS = 300.0        # Chunks quieter than this are always silence
+VAD_RATIO = 3.0            # Voiced when this many times louder than the room's noise floor
+VAD_HANGOVER = 3           # Chunks kept after speech so pauses between words aren't cut
+NOISE_ATTACK = 0.005       # Per-chunk step towards louder levels: a steady bed rises the floor over tens of seconds
+NOISE_RELEASE = 0.3        # Per-chunk step towards quieter levels, so the floor drops quickly once it goes quiet
+RECONNECT_MIN_DELAY = 1.0
+RECONNECT_MAX_DELAY = 60.0
+MAX_EVENTS_PER_ROOM = 100
+
+_models = {}
+
+def _load_vosk_model():
+    from vosk import Model
+    return Model(VOSK_MODEL_PATH)
+
+def get_vosk_model():
+    """The shared Vosk model, loaded on first use."""
+    return load_once('vosk', _models, _load_vosk_model)
+
+class RecognizerPool:
+    """Hands out KaldiRecognizers on the shared model and takes them back reset, instead of building one per use."""
+
+    def __init__(self, max_idle=MAX_RECOGNIZERS):
+        self.max_idle = max_idle
+        self.idle = []
+        self.lock = threading.Lock()
+        self.stats = {'created': 0, 'reused': 0}
+
+    def acquire(self):
+        with self.lock:
+            if self.idle:
+                self.stats['reused'] += 1
+                return self.idle.pop()
+            self.stats['created'] += 1
+        from vosk import KaldiRecognizer
+        rec = KaldiRecognizer(get_vosk_model(), SAMPLE_RATE)
+        rec.SetWords(True)
+        return rec
+
+    def release(self, rec):
+        try:
+            rec.Reset()
+        except AttributeError:
+            return  # Older Vosk cannot reset; let this one go
+        with self.lock:
+            if len(self.idle) < self.max_idle:
+                self.idle.append(rec)
+
+recognizers = RecognizerPool()
+
+def parse_result(result_json):
+    """Return (phrase, words) from a Vosk result, where words carry start times in recognizer seconds."""
+    result = json.loads(result_json)
+    words = result.get("result") or []
+    return " ".join(w["word"] for w in words), words
+
+class TranscriptFlagger:
+    """Transcribes a file's PCM chunk by chunk and keeps the first phrase flagging each keyword."""
+
+    def __init__(self):
+        self.rec = recognizers.acquire()
+        self.flags = {}
+
+    def feed(self, chunk):
+        if self.rec.AcceptWaveform(chunk):
+            self._match(self.rec.Result())
+
+    def close(self):
+        if self.rec is not None:
+            self._match(self.rec.FinalResult())
+            recognizers.release(self.rec)
+            self.rec = None
+        return self.flags
+
+    def _match(self, result_json):
+        phrase, words = parse_result(result_json)
+        if not phrase:
+            return
+        real_time_str = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+        for keyword, _, _ in registry.current().matcher.find_all(phrase):
+            if keyword not in self.flags:
+                self.flags[keyword] = {
+                    "phrase": phrase,
+                    "audio_timestamp": words[0]["start"],
+                    "realworld_timestamp": real_time_str
+                }
+
+class EnergyGate:
+    """Energy voice-activity detector with an adaptive noise floor and a short hangover.
+
+    The floor follows every chunk, voiced or not: it rises slowly so speech barely moves it but
+    constant music or crowd noise is eventually treated as background, and falls quickly."""
+
+    def __init__(self):
+        self.noise_floor = VAD_MIN_RMS / VAD_RATIO
+        self.hangover = 0
+
+    def voiced(self, chunk):
+        samples = np.frombuffer(chunk, dtype=np.int16).astype(np.float32)
+        rms = float(np.sqrt(np.mean(samples * samples))) if samples.size else 0.0
+        loud = rms > max(VAD_MIN_RMS, self.noise_floor * VAD_RATIO)
+        step = NOISE_ATTACK if rms > self.noise_floor else NOISE_RELEASE
+        self.noise_floor += step * (rms - self.noise_floor)
+        if loud:
+            self.hangover = VAD_HANGOVER
+            return True
+        if self.hangover:
+            self.hangover -= 1
+            return True
+        return False
+
+class RoomAudio:
+    """One room's ffmpeg audio pipe, VAD state and (while someone is talking) its recognizer."""
+
+    def __init__(self, room_url):
+        self.room_url = room_url
+        self.stop_event = threading.Event()
+        self.gate = EnergyGate()
+        self.rec = None
+        # Maps recognizer time back to stream time, since silence never reaches the recognizer
+        self.fed_seconds = 0.0
+        self.fed_starts = []
+        self.stream_starts = []
+        self.end_pending = False  # An end-of-utterance marker was dropped; finish before the next chunk
+
+    def stream_time(self, recognizer_seconds):
+        index = max(0, bisect.bisect_right(self.fed_starts, recognizer_seconds) - 1)
+        if not self.fed_starts:
+            return recognizer_seconds
+        return self.stream_starts[index] + recognizer_seconds - self.fed_starts[index]
+
+    def command(self):
+        return [
+            "ffmpeg", "-loglevel", "quiet", "-nostdin", "-i", self.room_url,
+            "-vn", "-ar", str(SAMPLE_RATE), "-ac", "1", "-f", "s16le", "-"
+        ]
+
+class AudioPipeline:
+    """Live ASR for every watched room.
+
+    Each room has an ffmpeg process and a reader thread that only blocks on the pipe; the
+    energy gate drops silence there. Voiced chunks go to a small, fixed set of ASR worker
+    threads, each room always to the same worker so its utterances stay in order. A room
+    holds a pooled recognizer only while speech is going on."""
+
+    def __init__(self, workers=ASR_WORKERS):
+        self.rooms = {}
+        self.events = defaultdict(lambda: deque(maxlen=MAX_EVENTS_PER_ROOM))
+        self.lock = threading.Lock()
+        self.queues = [queue.Queue(maxsize=QUEUE_SIZE) for _ in range(max(1, workers))]
+        self.threads = []
+        self.stats = {'chunks': 0, 'voiced_chunks': 0, 'dropped': 0, 'utterances': 0, 'flagged': 0, 'reconnects': 0}
+
+    def watch(self, room_url):
+        with self.lock:
+            if room_url in self.rooms:
+                return
+            room = RoomAudio(room_url)
+            self.rooms[room_url] = room
+            if not self.threads:
+                for q in self.queues:
+                    thread = threading.Thread(target=self._recognize, args=(q,), daemon=True)
+                    thread.start()
+                    self.threads.append(thread)
+        threading.Thread(target=self._read, args=(room,), daemon=True).start()
+
+    def unwatch(self, room_url):
+        with self.lock:
+            room = self.rooms.pop(room_url, None)
+            self.events.pop(room_url, None)
+        if room:
+            room.stop_event.set()
+            # Runs on a request thread, so never wait on a backed-up worker; the reader ends the utterance too
+            self._end_utterance(self._queue_for(room), room, None, block=False)
+
+    def drain(self, room_url):
+        """Return and clear the audio events flagged for a room since the last call."""
+        with self.lock:
+            events = self.events.get(room_url)
+            if not events:
+                return []
+            drained = list(events)
+            events.clear()
+            return drained
+
+    def _queue_for(self, room):
+        return self.queues[zlib.crc32(room.room_url.encode()) % len(self.queues)]
+
+    def _end_utterance(self, q, room, stream_offset, block=True):
+        try:
+            q.put((room, None, stream_offset), timeout=1.0 if block else None, block=block)
+        except queue.Full:
+            self.stats['dropped'] += 1
+            room.end_pending = True
+
+    def _read(self, room):
+        q = self._queue_for(room)
+        delay = RECONNECT_MIN_DELAY
+        stream_offset = 0.0
+        while not room.stop_event.is_set():
+            proc = subprocess.Popen(room.command(), stdout=subprocess.PIPE)
+            speaking = False
+            try:
+                while not room.stop_event.is_set():
+                    chunk = proc.stdout.read(CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    delay = RECONNECT_MIN_DELAY
+                    self.stats['chunks'] += 1
+                    chunk_start = stream_offset
+                    stream_offset += len(chunk) / BYTES_PER_SECOND
+                    if room.gate.voiced(chunk):
+                        speaking = True
+                        self.stats['voiced_chunks'] += 1
+                        try:
+                            q.put((room, chunk, chunk_start), timeout=1.0)
+                        except queue.Full:
+                            self.stats['dropped'] += 1
+                    elif speaking:
+                        # End of the utterance: let the worker finalize and free the recognizer
+                        speaking = False
+                        self._end_utterance(q, room, chunk_start)
+            finally:
+                if proc.poll() is None:
+                    proc.kill()
+                proc.stdout.close()
+                proc.wait()
+            if speaking:
+                self._end_utterance(q, room, stream_offset)
+            if room.stop_event.is_set():
+                break
+            self.stats['reconnects'] += 1
+            room.stop_event.wait(delay * random.uniform(0.5, 1.5))
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    def _recognize(self, q):
+        while True:
+            room, chunk, stream_offset = q.get()
+            try:
+                if room.end_pending:
+                    room.end_pending = False
+                    self._finish_utterance(room)
+                if chunk is None:
+                    self._finish_utterance(room)
+                elif not room.stop_event.is_set():
+                    self._feed(room, chunk, stream_offset)
+            except Exception as e:
+                print(f"Audio recognition for {room.room_url} failed: {e}")
+                self._release(room)
+
+    def _feed(self, room, chunk, stream_offset):
+        if room.rec is None:
+            room.rec = recognizers.acquire()
+            self.stats['utterances'] += 1
+        room.fed_starts.append(room.fed_seconds)
+        room.stream_starts.append(stream_offset)
+        room.fed_seconds += len(chunk) / BYTES_PER_SECOND
+        if room.rec.AcceptWaveform(chunk):
+            self._match(room, room.rec.Result())
+
+    def _finish_utterance(self, room):
+        if room.rec is not None:
+            if not room.stop_event.is_set():
+                self._match(room, room.rec.FinalResult())
+            self._release(room)
+
+    def _release(self, room):
+        if room.rec is not None:
+            recognizers.release(room.rec)
+        room.rec = None
+        room.fed_seconds = 0.0
+        room.fed_starts = []
+        room.stream_starts = []
+
+    def _match(self, room, result_json):
+        phrase, words = parse_result(result_json)
+        if not phrase:
+            return
+        matches = registry.current().matcher.find_all(phrase)
+        if not matches:
+            return
+        starts = []
+        position = 0
+        for w in words:
+            starts.append(position)
+            position += len(w["word"]) + 1
+        detected = []
+        for keyword, start, _ in matches:
+            word = words[max(0, bisect.bisect_right(starts, start) - 1)]
+            detected.append((keyword, round(room.stream_time(word["start"]), 2)))
+        self.stats['flagged'] += 1
+        with self.lock:
+            if self.rooms.get(room.room_url) is room:
+                self.events[room.room_url].append((detected, phrase, time.time()))
+
+pipeline = AudioPipeline()
 
 def detect(stream_url):
-    # Simulated audio detection (unchanged)
-    if random.randint(0, 10) > 8:
-        return "Audio anomaly detected"
+    pipeline.watch(stream_url)
+    events = pipeline.drain(stream_url)
+    if events:
+        return "; ".join(
+            "Audio flagged: " + ", ".join(f"{keyword} at {offset:.1f}s" for keyword, offset in detected)
+            + f" in phrase: '{phrase}'"
+            for detected, phrase, _ in events
+        )
     return None
-
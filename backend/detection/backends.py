@@ -0,0 +1,133 @@
+"""Detector backends. Each one takes a list of BGR frames and returns, per frame, an (N, 6) array of
+x1, y1, x2, y2, confidence, class_id in that frame's pixel coordinates, and exposes `names`."""
+import ast
+import os
+import sys
+
+import cv2
+import numpy as np
+
+DETECTOR_BACKEND = os.environ.get('DETECTOR_BACKEND', 'torch')   # 'torch' or 'onnx'
+DETECTOR_INPUT_SIZE = int(os.environ.get('DETECTOR_INPUT_SIZE', 640))  # Smaller is faster and misses small objects
+DETECTOR_THREADS = int(os.environ.get('DETECTOR_THREADS', 0))    # Intra-op threads; 0 keeps the library default
+# Set YOLO_WEIGHTS to a local .pt file (and YOLO_REPO to a local yolov5 checkout) to load without the network
+YOLO_WEIGHTS = os.environ.get('YOLO_WEIGHTS')
+YOLO_REPO = os.environ.get('YOLO_REPO')
+ONNX_MODEL_PATH = os.environ.get('ONNX_MODEL_PATH', 'yolov5s.onnx')  # From yolov5's export.py --include onnx
+ONNX_INT8 = os.environ.get('ONNX_INT8', '0') == '1'  # Quantise weights to INT8 on first load
+IOU_THRESHOLD = 0.45
+
+class TorchBackend:
+    """YOLOv5 from torch hub, the default."""
+
+    def __init__(self, input_size=DETECTOR_INPUT_SIZE, threads=None):
+        import torch
+        # Read at load time so a process can set DETECTOR_THREADS before its model loads
+        threads = DETECTOR_THREADS if threads is None else threads
+        if threads:
+            torch.set_num_threads(threads)
+        # Remove local 'models' module if present to avoid conflicts with YOLOv5’s internal package.
+        if 'models' in sys.modules:
+            del sys.modules['models']
+        repo, source = (YOLO_REPO, 'local') if YOLO_REPO else ('ultralytics/yolov5', 'github')
+        if YOLO_WEIGHTS:
+            model = torch.hub.load(repo, 'custom', path=YOLO_WEIGHTS, source=source, trust_repo=True)
+        else:
+            model = torch.hub.load(repo, 'yolov5s', pretrained=True, source=source, trust_repo=True)
+        # Set device and send the model to GPU if available
+        model.to('cuda' if torch.cuda.is_available() else 'cpu')
+        model.iou = IOU_THRESHOLD
+        self.model = model
+        self.input_size = input_size
+        self.names = model.names
+
+    def infer(self, frames, conf_threshold):
+        self.model.conf = conf_threshold
+        # The hub model expects RGB numpy images; contiguous copies so its cv2 letterbox accepts them
+        results = self.model([np.ascontiguousarray(frame[:, :, ::-1]) for frame in frames], size=self.input_size)
+        # One device-to-host copy per frame instead of an .item() call per element
+        return [d.cpu().numpy() for d in results.xyxy]
+
+def letterbox(frame, size):
+    """Resize keeping the aspect ratio and pad to size x size; returns the image, scale and padding."""
+    height, width = frame.shape[:2]
+    scale = min(size / height, size / width)
+    new_width, new_height = int(round(width * scale)), int(round(height * scale))
+    pad_x, pad_y = (size - new_width) // 2, (size - new_height) // 2
+    image = np.full((size, size, 3), 114, dtype=np.uint8)
+    image[pad_y:pad_y + new_height, pad_x:pad_x + new_width] = cv2.resize(frame, (new_width, new_height),
+                                                                         interpolation=cv2.INTER_LINEAR)
+    return image, scale, pad_x, pad_y
+
+def quantize(model_path):
+    """Write an INT8 (dynamic, weight-only) copy of an ONNX model next to it and return its path."""
+    quantized_path = model_path[:-len('.onnx')] + '.int8.onnx' if model_path.endswith('.onnx') else model_path + '.int8'
+    if not os.path.exists(quantized_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QUInt8)
+    return quantized_path
+
+class OnnxBackend:
+    """A YOLOv5 ONNX export run with ONNX Runtime on the CPU, optionally INT8-quantised."""
+
+    def __init__(self, model_path=ONNX_MODEL_PATH, input_size=DETECTOR_INPUT_SIZE, threads=None, int8=ONNX_INT8):
+        import onnxruntime as ort
+        threads = DETECTOR_THREADS if threads is None else threads
+        if int8:
+            model_path = quantize(model_path)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Exports have a fixed input size unless made with --dynamic
+        fixed_size = model_input.shape[2] if isinstance(model_input.shape[2], int) else None
+        self.input_size = fixed_size or input_size
+        self.fixed_batch = model_input.shape[0] if isinstance(model_input.shape[0], int) else None
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(metadata['names']) if 'names' in metadata else {i: str(i) for i in range(80)}
+
+    def infer(self, frames, conf_threshold):
+        prepared = [letterbox(frame, self.input_size) for frame in frames]
+        # BGR HWC uint8 -> RGB NCHW float in [0, 1]
+        batch = np.stack([image[:, :, ::-1] for image, _, _, _ in prepared]).transpose(0, 3, 1, 2)
+        batch = np.ascontiguousarray(batch, dtype=np.float32) / 255.0
+        if self.fixed_batch == 1:
+            outputs = [self.session.run(None, {self.input_name: batch[i:i + 1]})[0][0] for i in range(len(batch))]
+        else:
+            outputs = self.session.run(None, {self.input_name: batch})[0]
+        return [self._postprocess(output, conf_threshold, frames[i].shape, *prepared[i][1:]) for i, output in enumerate(outputs)]
+
+    def _postprocess(self, output, conf_threshold, shape, scale, pad_x, pad_y):
+        # Rows are cx, cy, w, h, objectness, then one score per class
+        output = output[output[:, 4] >= conf_threshold]
+        if not len(output):
+            return np.zeros((0, 6), dtype=np.float32)
+        class_scores = output[:, 5:] * output[:, 4:5]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(class_ids)), class_ids]
+        keep = scores >= conf_threshold
+        output, class_ids, scores = output[keep], class_ids[keep], scores[keep]
+        boxes = np.empty((len(output), 4), dtype=np.float32)
+        boxes[:, 0] = (output[:, 0] - output[:, 2] / 2 - pad_x) / scale
+        boxes[:, 1] = (output[:, 1] - output[:, 3] / 2 - pad_y) / scale
+        boxes[:, 2] = (output[:, 0] + output[:, 2] / 2 - pad_x) / scale
+        boxes[:, 3] = (output[:, 1] + output[:, 3] / 2 - pad_y) / scale
+        # Clip like the torch hub model does, so crops never index outside the frame
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, shape[1])
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, shape[0])
+        # Offset boxes by class so one NMS call never suppresses across classes
+        offsets = class_ids[:, None] * 4096.0
+        nms_boxes = np.concatenate([boxes[:, :2] + offsets, boxes[:, 2:] - boxes[:, :2]], axis=1)
+        kept = cv2.dnn.NMSBoxes(nms_boxes.tolist(), scores.tolist(), conf_threshold, IOU_THRESHOLD)
+        kept = np.array(kept, dtype=int).reshape(-1)
+        return np.concatenate([boxes[kept], scores[kept, None], class_ids[kept, None].astype(np.float32)], axis=1)
+
+BACKENDS = {'torch': TorchBackend, 'onnx': OnnxBackend}
+
+def create(name=DETECTOR_BACKEND, **options):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown detector backend '{name}', expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[name](**options)
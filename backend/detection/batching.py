@@ -0,0 +1,71 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+MAX_BATCH_SIZE = 8    # Largest number of frames sent through the model at once
+MAX_BATCH_WAIT = 0.05 # Seconds to wait for more frames before running a partial batch
+
+class InferenceEngine:
+    """Collects frames from every caller and runs them through the model in dynamic batches.
+
+    infer_batch receives a list of submitted items (frames, or whatever the caller packs
+    alongside them) and must return one result per item, in order. Each caller gets its
+    own result back through a Future."""
+
+    def __init__(self, infer_batch, max_batch_size=MAX_BATCH_SIZE, max_wait=MAX_BATCH_WAIT):
+        self.infer_batch = infer_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.thread = None
+        self.start_lock = threading.Lock()
+        self.stats = {'batches': 0, 'frames': 0}
+
+    def submit(self, item):
+        self._ensure_started()
+        future = Future()
+        self.requests.put((item, future))
+        return future
+
+    def infer(self, item, timeout=None):
+        """Blocking helper: submit one item and wait for its result."""
+        return self.submit(item).result(timeout)
+
+    def _ensure_started(self):
+        if self.thread is not None:
+            return
+        with self.start_lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+
+    def _collect_batch(self):
+        batch = [self.requests.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        # Drop requests whose callers already gave up
+        return [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            if not batch:
+                continue
+            try:
+                outputs = self.infer_batch([item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.stats['batches'] += 1
+            self.stats['frames'] += len(batch)
+            for (_, future), output in zip(batch, outputs):
+                future.set_result(output)
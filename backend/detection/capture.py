@@ -0,0 +1,127 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import cv2
+
+from .frames import FFmpegFrameSource, ffmpeg_available
+
+RING_SIZE = 4                 # Number of recent frames kept per stream
+RECONNECT_MIN_DELAY = 1.0     # Seconds before the first reconnect attempt
+RECONNECT_MAX_DELAY = 60.0    # Upper bound for the exponential backoff
+STALE_AFTER = 30.0            # Frames older than this are not handed out
+CAPTURE_FPS = float(os.environ.get('CAPTURE_FPS', 2.0))  # Frames decoded per second when ffmpeg is available
+
+class CaptureWorker:
+    """Keeps one stream connection open and decodes frames into a small ring buffer."""
+
+    def __init__(self, stream_url, ring_size=RING_SIZE):
+        self.stream_url = stream_url
+        self.frames = deque(maxlen=ring_size)
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.reconnects = 0
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def latest(self, max_age=STALE_AFTER):
+        """Return the most recent frame, or None if nothing fresh has been decoded yet."""
+        with self.lock:
+            if not self.frames:
+                return None
+            captured_at, frame = self.frames[-1]
+        if time.time() - captured_at > max_age:
+            return None
+        return frame
+
+    def _push(self, frame):
+        with self.lock:
+            self.frames.append((time.time(), frame))
+
+    def _read_ffmpeg(self):
+        """Let ffmpeg drop and downscale frames; returns True if any frame arrived."""
+        source = FFmpegFrameSource(self.stream_url, sample_fps=CAPTURE_FPS)
+        received = False
+        try:
+            for _, frame in source:
+                if self.stop_event.is_set():
+                    break
+                received = True
+                # Readers keep frames for a whole inference, so the ring gets its own copy of the small frame
+                self._push(frame.copy())
+        finally:
+            source.close()
+        return received
+
+    def _read_opencv(self):
+        cap = cv2.VideoCapture(self.stream_url)
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        received = False
+        while cap.isOpened() and not self.stop_event.is_set():
+            ret, frame = cap.read()
+            if not ret:
+                break
+            received = True
+            self._push(frame)
+        cap.release()
+        return received
+
+    def _run(self):
+        delay = RECONNECT_MIN_DELAY
+        use_ffmpeg = ffmpeg_available()
+        while not self.stop_event.is_set():
+            try:
+                received = self._read_ffmpeg() if use_ffmpeg else self._read_opencv()
+            except (OSError, RuntimeError, ValueError) as e:
+                print(f"Capture of {self.stream_url} failed: {e}")
+                received = False
+            if received:
+                delay = RECONNECT_MIN_DELAY
+            if self.stop_event.is_set():
+                break
+            # Jitter keeps hundreds of rooms from reconnecting in lockstep
+            self.reconnects += 1
+            self.stop_event.wait(delay * random.uniform(0.5, 1.5))
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+# One worker per stream URL, shared by every detector
+_workers = {}
+_workers_lock = threading.Lock()
+
+def get_worker(stream_url):
+    with _workers_lock:
+        worker = _workers.get(stream_url)
+        if worker is None:
+            worker = CaptureWorker(stream_url)
+            _workers[stream_url] = worker
+        worker.start()
+        return worker
+
+def latest_frame(stream_url, max_age=STALE_AFTER):
+    """Return the newest decoded frame for a stream without blocking.
+    The frame is shared with other readers and must not be modified in place."""
+    return get_worker(stream_url).latest(max_age)
+
+def stop_worker(stream_url):
+    with _workers_lock:
+        worker = _workers.pop(stream_url, None)
+    if worker:
+        worker.stop()
+
+def stop_all():
+    with _workers_lock:
+        workers = list(_workers.values())
+        _workers.clear()
+    for worker in workers:
+        worker.stop()
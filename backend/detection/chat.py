@@ -1,24 +1,258 @@
-import spacy
-from spacy.matcher import Matcher
+import os
+import queue
+import re
+import socket
+import threading
+import time
+from collections import defaultdict, deque
 
-nlp = spacy.load("en_core_web_sm")
-flagged_keywords = ["gun", "knife", "hate"]
-matcher = Matcher(nlp.vocab)
-for word in flagged_keywords:
-    pattern = [{"LOWER": word}]
-    matcher.add(word, [pattern])
+from . import registry
+from .loading import load_once
 
-def detect(stream_url):
-    # In a full implementation, you'd process live chat data.
-    # Here we simulate by processing a sample chat message.
-    sample_message = "I think there is a gun and a knife in this scene."
-    doc = nlp(sample_message)
-    matches = matcher(doc)
-    if matches:
-        detected = set()
-        for match_id, start, end in matches:
-            span = doc[start:end]
-            detected.add(span.text)
-        return f"Chat flagged: {', '.join(detected)} in message: '{sample_message}'"
+CHAT_SOURCE_DIR = os.environ.get('CHAT_SOURCE_DIR')        # One <streamer>.log file per room, tailed
+CHAT_SOURCE_SOCKET = os.environ.get('CHAT_SOURCE_SOCKET')  # host:port sending "room_url<TAB>message" lines
+QUEUE_SIZE = 10000     # Messages waiting for NLP; beyond this the oldest are dropped
+BATCH_SIZE = 256       # Messages per nlp.pipe call
+BATCH_WAIT = 0.2       # Seconds to wait for a fuller batch
+MAX_EVENTS_PER_ROOM = 100
+
+_models = {}
+
+def _load_nlp():
+    import spacy
+    return spacy.load("en_core_web_sm", disable=["parser", "ner"])
+
+def get_nlp():
+    """The spaCy model with the components chat matching doesn't need disabled, loaded on first use."""
+    return load_once('spacy', _models, _load_nlp)
+
+class ChatSource:
+    """Delivers one room's chat messages to a callback on its own thread."""
+
+    def __init__(self, room_url):
+        self.room_url = room_url
+        self.stop_event = threading.Event()
+
+    def start(self, on_message):
+        threading.Thread(target=self.run, args=(on_message,), daemon=True).start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self, on_message):
+        raise NotImplementedError
+
+class FileChatSource(ChatSource):
+    """Tails a text file, one message per line; a local stand-in for a platform chat feed."""
+
+    def __init__(self, room_url, path, poll_interval=0.5):
+        super().__init__(room_url)
+        self.path = path
+        self.poll_interval = poll_interval
+
+    def run(self, on_message):
+        while not self.stop_event.is_set() and not os.path.exists(self.path):
+            self.stop_event.wait(self.poll_interval)
+        if self.stop_event.is_set():
+            return
+        with open(self.path, encoding='utf-8', errors='replace') as f:
+            f.seek(0, os.SEEK_END)
+            while not self.stop_event.is_set():
+                line = f.readline()
+                if not line:
+                    self.stop_event.wait(self.poll_interval)
+                    continue
+                if line.strip():
+                    on_message(self.room_url, line.strip())
+
+class SocketChatFeed:
+    """One TCP connection reading newline-delimited 'room_url<TAB>message' lines for every room.
+
+    Each line is handed to the callback of the room it names, so watching N rooms costs one
+    connection and one parse per message rather than N. The reader stops once no room is left."""
+
+    def __init__(self, host, port, reconnect_delay=5.0):
+        self.host = host
+        self.port = port
+        self.reconnect_delay = reconnect_delay
+        self.rooms = {}  # room_url -> on_message
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def subscribe(self, room_url, on_message):
+        with self.lock:
+            self.rooms[room_url] = on_message
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+
+    def unsubscribe(self, room_url):
+        with self.lock:
+            self.rooms.pop(room_url, None)
+
+    def _idle(self):
+        with self.lock:
+            if not self.rooms:
+                self.thread = None
+                return True
+            return False
+
+    def _run(self):
+        while not self._idle():
+            try:
+                with socket.create_connection((self.host, self.port), timeout=30) as conn:
+                    # The timeout is for connecting; a chat that is quiet for a while is not a failure
+                    conn.settimeout(None)
+                    conn.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+                    for line in conn.makefile(encoding='utf-8', errors='replace'):
+                        room_url, _, text = line.rstrip('\n').partition('\t')
+                        with self.lock:
+                            on_message = self.rooms.get(room_url)
+                        if on_message and text.strip():
+                            on_message(room_url, text.strip())
+                        elif self._idle():
+                            return
+            except OSError as e:
+                print(f"Chat socket {self.host}:{self.port} failed: {e}")
+            time.sleep(self.reconnect_delay)
+
+# One shared reader per chat socket
+_socket_feeds = {}
+_socket_feeds_lock = threading.Lock()
+
+def get_socket_feed(host, port):
+    with _socket_feeds_lock:
+        feed = _socket_feeds.get((host, port))
+        if feed is None:
+            feed = SocketChatFeed(host, port)
+            _socket_feeds[(host, port)] = feed
+        return feed
+
+class SocketChatSource(ChatSource):
+    """One room's messages from the shared reader of a chat socket."""
+
+    def __init__(self, room_url, host, port):
+        super().__init__(room_url)
+        self.feed = get_socket_feed(host, port)
+
+    def start(self, on_message):
+        self.feed.subscribe(self.room_url, on_message)
+
+    def stop(self):
+        super().stop()
+        self.feed.unsubscribe(self.room_url)
+
+def make_source(room_url):
+    """Pick the configured chat source for a room, or None when no chat feed is configured."""
+    if CHAT_SOURCE_SOCKET:
+        host, _, port = CHAT_SOURCE_SOCKET.rpartition(':')
+        return SocketChatSource(room_url, host, int(port))
+    if CHAT_SOURCE_DIR:
+        name = re.sub(r'[^A-Za-z0-9_.-]', '_', room_url.rstrip('/').split('/')[-1])
+        return FileChatSource(room_url, os.path.join(CHAT_SOURCE_DIR, f"{name}.log"))
     return None
 
+class ChatPipeline:
+    """Collects messages from every room into a bounded queue and matches them in nlp.pipe batches.
+
+    Keywords are matched against both the raw text and its lemmas, so 'guns' hits 'gun'."""
+
+    def __init__(self, source_factory=make_source, batch_size=BATCH_SIZE):
+        self.source_factory = source_factory
+        self.batch_size = batch_size
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.sources = {}
+        self.events = defaultdict(lambda: deque(maxlen=MAX_EVENTS_PER_ROOM))
+        self.lock = threading.Lock()
+        self.stats = {'messages': 0, 'dropped': 0, 'batches': 0, 'flagged': 0}
+        self.thread = None
+
+    def watch(self, room_url):
+        with self.lock:
+            if room_url in self.sources:
+                return
+            source = self.source_factory(room_url)
+            self.sources[room_url] = source
+            if source and self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+        if source:
+            source.start(self.submit)
+
+    def unwatch(self, room_url):
+        with self.lock:
+            source = self.sources.pop(room_url, None)
+            self.events.pop(room_url, None)
+        if source:
+            source.stop()
+
+    def submit(self, room_url, text):
+        while True:
+            try:
+                self.queue.put_nowait((room_url, text))
+                return
+            except queue.Full:
+                # Busy rooms lose their oldest unprocessed messages rather than blocking the source
+                try:
+                    self.queue.get_nowait()
+                    self.stats['dropped'] += 1
+                except queue.Empty:
+                    pass
+
+    def drain(self, room_url):
+        """Return and clear the chat events flagged for a room since the last call."""
+        with self.lock:
+            events = self.events.get(room_url)
+            if not events:
+                return []
+            drained = list(events)
+            events.clear()
+            return drained
+
+    def _next_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + BATCH_WAIT
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self._match(batch)
+            except Exception as e:
+                # Lose this batch, not the thread; rooms keep queueing behind it
+                print(f"Chat matching failed: {e}")
+
+    def _match(self, batch):
+        nlp = get_nlp()
+        matcher = registry.current().matcher
+        texts = [text for _, text in batch]
+        # In-process on purpose: n_process > 1 would start and tear down a worker pool per batch
+        docs = nlp.pipe(texts, batch_size=self.batch_size)
+        self.stats['batches'] += 1
+        self.stats['messages'] += len(batch)
+        for (room_url, text), doc in zip(batch, docs):
+            lemmas = ' '.join(token.lemma_ for token in doc)
+            detected = matcher.search(text) | matcher.search(lemmas)
+            if detected:
+                self.stats['flagged'] += 1
+                with self.lock:
+                    if room_url in self.sources:
+                        self.events[room_url].append((sorted(detected), text))
+
+pipeline = ChatPipeline()
+
+def detect(stream_url):
+    pipeline.watch(stream_url)
+    events = pipeline.drain(stream_url)
+    if events:
+        return "; ".join(f"Chat flagged: {', '.join(detected)} in message: '{text}'" for detected, text in events)
+    return None
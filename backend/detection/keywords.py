@@ -0,0 +1,88 @@
+from collections import deque
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == '_'
+
+def _fold(text):
+    """Lowercase text without changing its length, so offsets into the result are offsets into text."""
+    folded = text.lower()
+    if len(folded) == len(text):
+        return folded
+    # A few characters lowercase to more than one (like 'İ' to 'i̇'); those are kept as they are
+    return ''.join(lower if len(lower) == 1 else ch for ch, lower in ((ch, ch.lower()) for ch in text))
+
+class KeywordMatcher:
+    """Aho-Corasick automaton that finds every keyword in a text in a single pass.
+
+    Matching is case-insensitive and respects word boundaries, so 'gun' matches
+    'a gun!' but not 'begun'. Keywords that start or end with punctuation are only
+    bounded on their word-character edges."""
+
+    def __init__(self, keywords):
+        self.keywords = []
+        self.goto = [{}]
+        self.fail = [0]
+        self.outputs = [[]]
+        seen = set()
+        for keyword in keywords:
+            key = _fold(keyword.strip())
+            if key and key not in seen:
+                seen.add(key)
+                self._add(key, keyword.strip())
+        self._build_failure_links()
+
+    def _add(self, key, original):
+        state = 0
+        for ch in key:
+            next_state = self.goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][ch] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.outputs.append([])
+            state = next_state
+        self.outputs[state].append(len(self.keywords))
+        self.keywords.append((original, len(key), _is_word_char(key[0]), _is_word_char(key[-1])))
+
+    def _build_failure_links(self):
+        # Depth-one states fail back to the root, which is their initial value
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(ch, 0)
+                # Fold in the matches of the fallback state so lookups need no chain walk
+                self.outputs[next_state] = self.outputs[next_state] + self.outputs[self.fail[next_state]]
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def find_all(self, text):
+        """Return (keyword, start, end) for every match, with offsets into text."""
+        lowered = _fold(text)
+        goto, fail, outputs, keywords = self.goto, self.fail, self.outputs, self.keywords
+        length = len(lowered)
+        matches = []
+        state = 0
+        for i, ch in enumerate(lowered):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for index in outputs[state]:
+                original, key_length, bounded_start, bounded_end = keywords[index]
+                start = i - key_length + 1
+                if bounded_start and start > 0 and _is_word_char(lowered[start - 1]):
+                    continue
+                if bounded_end and i + 1 < length and _is_word_char(lowered[i + 1]):
+                    continue
+                matches.append((original, start, i + 1))
+        return matches
+
+    def search(self, text):
+        """Return the set of keywords that occur in text."""
+        return {keyword for keyword, _, _ in self.find_all(text)}
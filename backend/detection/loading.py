@@ -0,0 +1,19 @@
+import threading
+import time
+
+# Seconds each model took to load in this process, for the startup report
+load_times = {}
+_lock = threading.Lock()
+
+def load_once(name, holder, loader):
+    """Call loader() the first time name is requested and cache the result in holder[name]."""
+    model = holder.get(name)
+    if model is not None:
+        return model
+    with _lock:
+        if holder.get(name) is None:
+            started = time.monotonic()
+            holder[name] = loader()
+            load_times[name] = time.monotonic() - started
+            print(f"Loaded {name} model in {load_times[name]:.2f}s")
+        return holder[name]
@@ -0,0 +1,85 @@
+import threading
+
+import cv2
+import numpy as np
+
+GATE_SIZE = (64, 36)      # Frames are compared at this (width, height) in grayscale
+MOTION_THRESHOLD = 0.02   # Mean absolute difference (0-1) below which a frame counts as unchanged
+MAX_SKIPS = 30            # Force a fresh inference after this many consecutive skips
+
+# Counters across every gate, so we can see how many forward passes were saved
+totals = {'frames': 0, 'inferences': 0, 'skipped': 0}
+_totals_lock = threading.Lock()
+
+def _signature(frame):
+    small = cv2.resize(frame, GATE_SIZE, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+def _count(key):
+    with _totals_lock:
+        totals[key] += 1
+
+class MotionGate:
+    """Skips inference when a frame barely differs from the one last sent to the model."""
+
+    def __init__(self, threshold=MOTION_THRESHOLD, max_skips=MAX_SKIPS):
+        self.threshold = threshold
+        self.max_skips = max_skips
+        self.reference = None
+        self.params = None
+        self.last_result = None
+        self.skips = 0
+        self.lock = threading.Lock()
+        self.stats = {'frames': 0, 'inferences': 0, 'skipped': 0}
+
+    def difference(self, signature):
+        return float(np.mean(cv2.absdiff(signature, self.reference))) / 255.0
+
+    def run(self, frame, detect_fn, params=None):
+        """Return detect_fn(frame), or the previous result if the scene has not changed.
+        A change in params (e.g. thresholds) always forces a fresh inference."""
+        signature = _signature(frame)
+        with self.lock:
+            self.stats['frames'] += 1
+            reuse = (self.reference is not None
+                     and params == self.params
+                     and self.skips < self.max_skips
+                     and self.difference(signature) < self.threshold)
+            if reuse:
+                self.skips += 1
+                self.stats['skipped'] += 1
+                result = self.last_result
+        _count('frames')
+        if reuse:
+            _count('skipped')
+            return result
+        result = detect_fn(frame)
+        with self.lock:
+            # Compare against the frame that was actually inferred so slow drift still triggers
+            self.reference = signature
+            self.params = params
+            self.last_result = result
+            self.skips = 0
+            self.stats['inferences'] += 1
+        _count('inferences')
+        return result
+
+# Gates for live streams, keyed by stream URL
+_gates = {}
+_gates_lock = threading.Lock()
+
+def get_gate(key):
+    with _gates_lock:
+        gate = _gates.get(key)
+        if gate is None:
+            gate = MotionGate()
+            _gates[key] = gate
+        return gate
+
+def remove_gate(key):
+    with _gates_lock:
+        _gates.pop(key, None)
+
+def get_stats():
+    with _totals_lock:
+        return dict(totals)
@@ -0,0 +1,58 @@
+import threading
+
+from periodic import PeriodicJob
+
+from .keywords import KeywordMatcher
+
+class RegistrySnapshot:
+    """One immutable, compiled version of the flagged keywords and flagged objects."""
+
+    def __init__(self, version, keywords, object_thresholds):
+        self.version = version
+        self.keywords = tuple(keywords)
+        self.matcher = KeywordMatcher(self.keywords)
+        self.object_thresholds = dict(object_thresholds)  # object name -> confidence threshold
+
+class FlaggedRegistry:
+    """Holds the current snapshot for every detector in this process.
+
+    Readers take `registry.snapshot` (a single attribute read, no lock) and keep using
+    that object for the whole check. Writers compile a new snapshot off to the side and
+    swap it in, so a half-built matcher is never visible."""
+
+    def __init__(self):
+        self.snapshot = RegistrySnapshot(-1, [], {})
+        self.lock = threading.Lock()
+
+    def install(self, version, keywords, object_thresholds):
+        snapshot = RegistrySnapshot(version, keywords, object_thresholds)
+        with self.lock:
+            # A slower reload must not replace a newer version installed meanwhile
+            if version >= self.snapshot.version:
+                self.snapshot = snapshot
+            return self.snapshot
+
+registry = FlaggedRegistry()
+
+def current():
+    return registry.snapshot
+
+class RegistryWatcher(PeriodicJob):
+    """Reloads the registry when the shared version counter moves, e.g. after another process wrote.
+
+    read_version() returns the stored version; load() returns (version, keywords, object_thresholds).
+    Only the small version query runs on each poll."""
+
+    description = 'Registry reload'
+
+    def __init__(self, read_version, load, interval=2.0):
+        super().__init__(interval)
+        self.read_version = read_version
+        self.load = load
+
+    def reload(self):
+        return registry.install(*self.load())
+
+    def run_once(self):
+        if self.read_version() != registry.snapshot.version:
+            self.reload()
@@ -0,0 +1,152 @@
+import math
+import threading
+from collections import deque
+
+IOU_THRESHOLD = 0.3       # Minimum overlap for a detection to continue a track
+CENTROID_DISTANCE = 0.5   # Otherwise, centres closer than this fraction of the box diagonal also match
+MAX_MISSED = 3            # Updates a track may go undetected before it is closed
+LIVE_MAX_FINISHED = 1000  # Closed tracks a live stream's tracker remembers
+
+def _iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    intersection = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 0.0
+
+def _centroid_close(a, b):
+    ax, ay = (a[0] + a[2]) / 2, (a[1] + a[3]) / 2
+    bx, by = (b[0] + b[2]) / 2, (b[1] + b[3]) / 2
+    diagonal = math.hypot(a[2] - a[0], a[3] - a[1])
+    return math.hypot(ax - bx, ay - by) <= CENTROID_DISTANCE * diagonal
+
+class Track:
+    """One object followed across frames."""
+
+    def __init__(self, track_id, detection, timestamp):
+        self.track_id = track_id
+        self.cls = detection['class']
+        self.box = tuple(float(v) for v in detection['box'])
+        self.velocity = (0.0, 0.0, 0.0, 0.0)  # Box change per second, for carrying boxes forward
+        self.confidence = detection['confidence']
+        self.max_confidence = detection['confidence']
+        self.start = timestamp
+        self.last_seen = timestamp
+        self.hits = 1
+        self.missed = 0
+
+    def update(self, detection, timestamp):
+        box = tuple(float(v) for v in detection['box'])
+        elapsed = timestamp - self.last_seen
+        if elapsed > 0:
+            self.velocity = tuple((new - old) / elapsed for new, old in zip(box, self.box))
+        self.box = box
+        self.confidence = detection['confidence']
+        self.max_confidence = max(self.max_confidence, detection['confidence'])
+        self.last_seen = timestamp
+        self.hits += 1
+        self.missed = 0
+
+    def predict(self, timestamp):
+        """Box extrapolated to timestamp from the last two sightings."""
+        elapsed = timestamp - self.last_seen
+        return tuple(v + d * elapsed for v, d in zip(self.box, self.velocity))
+
+    def to_interval(self):
+        return {
+            "track_id": self.track_id,
+            "class": self.cls,
+            "start": round(self.start, 3),
+            "end": round(self.last_seen, 3),
+            "hits": self.hits,
+            "max_confidence": round(self.max_confidence, 4),
+        }
+
+class IouTracker:
+    """Links detections into tracks by class and box overlap (falling back to centroid distance).
+
+    update() takes the detections of one inferred frame ({'class', 'confidence', 'box'} dicts,
+    as from Detections.to_list/to_objects) and returns (track_id, detection) pairs. Tracks that
+    go MAX_MISSED updates without a match are closed and kept as appearance intervals."""
+
+    def __init__(self, iou_threshold=IOU_THRESHOLD, max_missed=MAX_MISSED, first_id=1, max_finished=None):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.next_id = first_id
+        self.active = []
+        self.finished = deque(maxlen=max_finished)
+        self.lock = threading.RLock()
+
+    def update(self, detections, timestamp):
+        with self.lock:
+            candidates = []
+            for t, track in enumerate(self.active):
+                for d, det in enumerate(detections):
+                    if det['class'] != track.cls:
+                        continue
+                    overlap = _iou(track.predict(timestamp), det['box'])
+                    if overlap >= self.iou_threshold:
+                        candidates.append((overlap, t, d))
+                    elif _centroid_close(track.predict(timestamp), det['box']):
+                        candidates.append((0.0, t, d))
+            # Best overlaps first; each track and detection is used once
+            candidates.sort(key=lambda c: c[0], reverse=True)
+            matched_tracks, matched = set(), {}
+            for _, t, d in candidates:
+                if t in matched_tracks or d in matched:
+                    continue
+                matched_tracks.add(t)
+                matched[d] = self.active[t]
+                self.active[t].update(detections[d], timestamp)
+            still_active = []
+            for t, track in enumerate(self.active):
+                if t not in matched_tracks:
+                    track.missed += 1
+                    if track.missed > self.max_missed:
+                        self.finished.append(track)
+                        continue
+                still_active.append(track)
+            self.active = still_active
+            results = []
+            for d, det in enumerate(detections):
+                track = matched.get(d)
+                if track is None:
+                    track = Track(self.next_id, det, timestamp)
+                    self.next_id += 1
+                    self.active.append(track)
+                results.append((track.track_id, det))
+            return results
+
+    def new_tracks(self, detections, timestamp):
+        """Update and return only the detections that started a track, i.e. objects seen for the first time."""
+        with self.lock:
+            before = self.next_id
+            return [(track_id, det) for track_id, det in self.update(detections, timestamp) if track_id >= before]
+
+    def predict(self, timestamp):
+        """Boxes of the live tracks carried forward to timestamp, for frames that were not inferred."""
+        with self.lock:
+            return [(track.track_id, track.cls, track.confidence, track.predict(timestamp))
+                    for track in self.active if track.missed == 0]
+
+    def intervals(self):
+        """Appearance intervals of every track so far, closed and still open, ordered by start."""
+        with self.lock:
+            tracks = list(self.finished) + self.active
+            return sorted((track.to_interval() for track in tracks), key=lambda i: (i["start"], i["track_id"]))
+
+# Trackers for live streams, keyed by stream URL
+_trackers = {}
+_trackers_lock = threading.Lock()
+
+def get_tracker(key):
+    with _trackers_lock:
+        tracker = _trackers.get(key)
+        if tracker is None:
+            tracker = IouTracker(max_finished=LIVE_MAX_FINISHED)
+            _trackers[key] = tracker
+        return tracker
+
+def remove_tracker(key):
+    with _trackers_lock:
+        _trackers.pop(key, None)
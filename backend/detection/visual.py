@@ -1,65 +1,121 @@
-import sys
-# Remove local 'models' module if present to avoid conflicts with YOLOv5’s internal package.
-if 'models' in sys.modules:
-    del sys.modules['models']
+import time
 
 import cv2
-import torch
 import numpy as np
+from . import backends, capture, motion, tracker
+from .batching import InferenceEngine
+from .loading import load_once
 
-# Set device and send the model to GPU if available
-device = 'cuda' if torch.cuda.is_available() else 'cpu'
-model = torch.hub.load('ultralytics/yolov5', 'yolov5s', pretrained=True, trust_repo=True)
-model.to(device)
-CONF_THRESHOLD = 0.5  # Default confidence threshold
-
-def detect(stream_url):
-    cap = cv2.VideoCapture(stream_url)
-    ret, frame = cap.read()
-    cap.release()
-    if not ret:
-        return None
-    return detect_frame(frame)
-
-def detect_frame(frame):
-    results = model(frame)
-    detections = results.xyxy[0]  # Tensor of detections
-    detected = []
-    for *box, conf, cls in detections:
-        if conf.item() >= CONF_THRESHOLD:
-            class_name = model.names[int(cls)]
-            detected.append({
-                'class': class_name,
-                'confidence': conf.item(),
-                'box': [float(x) for x in box]
-            })
-    return detected
-
-def detect_and_annotate_frame(frame):
-    """Run object detection and annotate the frame with bounding boxes and labels."""
-    results = model(frame)
-    detections = results.xyxy[0]
-    for *box, conf, cls in detections:
-        if conf.item() >= CONF_THRESHOLD:
-            class_name = model.names[int(cls)]
-            x1, y1, x2, y2 = [int(x.item()) for x in box]
+_models = {}
+
+def get_model():
+    """The configured detector backend (see backends.py), loaded on first use."""
+    return load_once('yolov5', _models, backends.create)
+
+CONF_THRESHOLD = 0.5  # Default confidence threshold; pass conf_threshold per call instead of changing this
+
+def _infer_batch(requests):
+    """Run one forward pass over a list of (frame, min_conf) requests and return an (N, 6) array per frame."""
+    frames = [frame for frame, _ in requests]
+    # Let the backend drop boxes below the loosest threshold in the batch;
+    # only the engine thread calls the model, so this does not race.
+    return get_model().infer(frames, min(min_conf for _, min_conf in requests))
+
+# Shared by monitor threads and upload pipelines so frames from all streams are batched together
+engine = InferenceEngine(_infer_batch)
+
+class Detections:
+    """Detections for one frame: boxes (N, 4) as x1, y1, x2, y2, scores (N,) and class_ids (N,)."""
+
+    def __init__(self, boxes, scores, class_ids):
+        self.boxes = boxes
+        self.scores = scores
+        self.class_ids = class_ids
+
+    @classmethod
+    def from_array(cls, array, conf_threshold, class_thresholds=None):
+        thresholds = np.full(len(array), conf_threshold)
+        if class_thresholds:
+            class_ids = array[:, 5].astype(int)
+            for class_id, threshold in _class_id_thresholds(class_thresholds).items():
+                thresholds[class_ids == class_id] = threshold
+        array = array[array[:, 4] >= thresholds]
+        return cls(array[:, :4], array[:, 4], array[:, 5].astype(int))
+
+    def __len__(self):
+        return len(self.scores)
+
+    def class_names(self):
+        names = get_model().names
+        return [names[c] for c in self.class_ids]
+
+    def to_list(self):
+        """JSON-ready list with float boxes."""
+        return [{'class': name, 'confidence': float(score), 'box': box}
+                for name, score, box in zip(self.class_names(), self.scores, self.boxes.tolist())]
+
+    def to_objects(self):
+        """List with integer pixel boxes, suitable for cropping."""
+        return [{'class': name, 'confidence': float(score), 'box': tuple(box)}
+                for name, score, box in zip(self.class_names(), self.scores, self.boxes.astype(int).tolist())]
+
+    def annotate(self, frame):
+        """Draw boxes and labels onto frame in place and return it."""
+        for name, score, (x1, y1, x2, y2) in zip(self.class_names(), self.scores, self.boxes.astype(int).tolist()):
             cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-            cv2.putText(frame, f"{class_name} {conf.item():.2f}", (x1, y1 - 10),
+            cv2.putText(frame, f"{name} {score:.2f}", (x1, y1 - 10),
                         cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+        return frame
+
+def draw_tracks(frame, tracks):
+    """Draw (track_id, class, confidence, box) tuples from IouTracker.predict onto frame in place and return it."""
+    for track_id, name, score, box in tracks:
+        x1, y1, x2, y2 = (int(v) for v in box)
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        cv2.putText(frame, f"{name} #{track_id} {score:.2f}", (x1, y1 - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
     return frame
 
-def extract_detections(frame):
+def _class_id_thresholds(class_thresholds):
+    """Map {class_name: threshold} to {class_id: threshold}, ignoring names the model does not know."""
+    name_to_id = {name: class_id for class_id, name in _model_names().items()}
+    return {name_to_id[name]: threshold for name, threshold in class_thresholds.items() if name in name_to_id}
+
+def _model_names():
+    names = get_model().names
+    return names if isinstance(names, dict) else dict(enumerate(names))
+
+def detect_objects(frame, conf_threshold=None, class_thresholds=None):
+    """Run the model once and return a Detections result that can be annotated and serialised.
+
+    conf_threshold applies to this call only (defaults to CONF_THRESHOLD); class_thresholds
+    optionally overrides it per class name, e.g. {'knife': 0.3}."""
+    if conf_threshold is None:
+        conf_threshold = CONF_THRESHOLD
+    min_conf = min([conf_threshold] + list((class_thresholds or {}).values()))
+    array = engine.infer((frame, min_conf))
+    return Detections.from_array(array, conf_threshold, class_thresholds)
+
+def detect(stream_url, conf_threshold=None, class_thresholds=None):
+    # Pull the newest frame from the stream's persistent capture worker
+    frame = capture.latest_frame(stream_url)
+    if frame is None:
+        return None
+    # Static rooms reuse the previous detections instead of running the model again
+    gate = motion.get_gate(stream_url)
+    detections = gate.run(frame, lambda f: detect_frame(f, conf_threshold, class_thresholds),
+                          params=(conf_threshold, class_thresholds))
+    # Report each object once, when its track starts, rather than on every sample it stays in view
+    new = tracker.get_tracker(stream_url).new_tracks(detections, time.monotonic())
+    return [dict(det, track_id=track_id) for track_id, det in new] or None
+
+def detect_frame(frame, conf_threshold=None, class_thresholds=None):
+    return detect_objects(frame, conf_threshold, class_thresholds).to_list()
+
+def detect_and_annotate_frame(frame, conf_threshold=None, class_thresholds=None):
+    """Run object detection and annotate the frame with bounding boxes and labels."""
+    return detect_objects(frame, conf_threshold, class_thresholds).annotate(frame)
+
+def extract_detections(frame, conf_threshold=None, class_thresholds=None):
     """Return a list of detected objects (without annotation) including bounding boxes."""
-    results = model(frame)
-    detections = results.xyxy[0]
-    objs = []
-    for *box, conf, cls in detections:
-        if conf.item() >= CONF_THRESHOLD:
-            class_name = model.names[int(cls)]
-            x1, y1, x2, y2 = [int(x.item()) for x in box]
-            objs.append({
-                'class': class_name,
-                'confidence': conf.item(),
-                'box': (x1, y1, x2, y2)
-            })
-    return objs
+    return detect_objects(frame, conf_threshold, class_thresholds).to_objects()
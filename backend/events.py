@@ -0,0 +1,160 @@
+import itertools
+import json
+import threading
+import uuid
+from collections import deque
+from datetime import datetime
+
+from sqlalchemy.orm import defer
+
+import jobs
+from models import db, Job, Log
+from periodic import PeriodicJob
+from results_store import load_result
+
+HISTORY_SIZE = 2000       # Events kept for clients resuming with Last-Event-ID
+HEARTBEAT_INTERVAL = 15   # Seconds between keep-alive comments on an idle stream
+POLL_INTERVAL = 1.0       # Seconds between change-feed queries
+POLL_BATCH = 500          # Log rows turned into alerts per query
+TOPICS = ('alert', 'job', 'thumbnail', 'audio_flag')
+
+class EventBroadcaster:
+    """Fans events out to every Server-Sent Events client.
+
+    Each event is formatted once and kept in a ring buffer; subscribers only wait on a
+    condition and write the shared text, so a thousand open dashboards cost one publish.
+    Event IDs are '<boot>-<sequence>' with a random boot token per process, so a client resuming
+    against a restarted server, or another API process, is told to reload instead of silently
+    missing events."""
+
+    def __init__(self, history=HISTORY_SIZE):
+        self.boot = uuid.uuid4().hex
+        self.sequence = 0
+        self.history = deque(maxlen=history)  # (sequence, topic, key, text)
+        self.condition = threading.Condition()
+        self.subscribers = 0
+        self.stats = {'published': 0, 'resumed': 0, 'resets': 0}
+
+    def publish(self, topic, data, key=None):
+        """Send data to subscribers of topic; key (a room URL or video filename) lets clients filter."""
+        with self.condition:
+            self.sequence += 1
+            text = f"id: {self.boot}-{self.sequence}\nevent: {topic}\ndata: {json.dumps(data, default=str)}\n\n"
+            self.history.append((self.sequence, topic, key, text))
+            self.stats['published'] += 1
+            self.condition.notify_all()
+
+    def _resume_point(self, last_event_id):
+        """Sequence to replay after, or None when the client's position is lost."""
+        boot, _, sequence = (last_event_id or '').partition('-')
+        if boot != self.boot or not sequence.isdigit():
+            return None
+        sequence = int(sequence)
+        oldest = self.history[0][0] if self.history else self.sequence + 1
+        return sequence if oldest - 1 <= sequence <= self.sequence else None
+
+    def listen(self, topics=None, keys=None, last_event_id=None):
+        """Yield SSE text for matching events until the client disconnects."""
+        def wanted(topic, key):
+            return (topics is None or topic in topics) and (keys is None or key in keys)
+
+        with self.condition:
+            self.subscribers += 1
+            position = self.sequence
+            resume = None
+            if last_event_id:
+                resume = self._resume_point(last_event_id)
+                if resume is None:
+                    self.stats['resets'] += 1
+                else:
+                    self.stats['resumed'] += 1
+                    position = resume
+        try:
+            yield "retry: 3000\n\n"
+            if last_event_id and resume is None:
+                # The client must fetch current state through the REST endpoints
+                yield f"event: reset\ndata: {json.dumps({'reason': 'history unavailable'})}\n\n"
+            while True:
+                with self.condition:
+                    if self.sequence == position:
+                        self.condition.wait(HEARTBEAT_INTERVAL)
+                    # Sequences are consecutive, so what's new is the tail; walking it keeps a wakeup O(new events)
+                    count = min(self.sequence - position, len(self.history))
+                    pending = list(itertools.islice(reversed(self.history), count))[::-1]
+                    position = self.sequence
+                batch = ''.join(text for _, topic, key, text in pending if wanted(topic, key))
+                yield batch or ": keep-alive\n\n"
+        finally:
+            with self.condition:
+                self.subscribers -= 1
+
+broadcaster = EventBroadcaster()
+
+class ChangeFeed(PeriodicJob):
+    """Publishes new alerts and job updates, whichever process wrote them, by polling the database.
+
+    One query per table per interval serves every subscriber: new Log rows become 'alert'
+    events, and changed jobs become 'job' events plus a 'thumbnail' or 'audio_flag' event for
+    each gallery class or keyword that was not in the previous update."""
+
+    description = 'Event change feed'
+
+    def __init__(self, app, broadcaster, interval=POLL_INTERVAL):
+        super().__init__(interval)
+        self.app = app
+        self.broadcaster = broadcaster
+        self.last_log_id = None
+        self.last_job_update = None
+        self.seen = {}  # job id -> (updated_at, gallery classes, flagged keywords, finished)
+
+    def run_once(self):
+        # On failure the app context has already discarded the session; the next poll starts clean
+        with self.app.app_context():
+            if self.last_log_id is None:
+                # Start from now; history before the first subscriber is available through /api/logs
+                self.last_log_id = db.session.query(db.func.max(Log.id)).scalar() or 0
+                self.last_job_update = datetime.utcnow()
+            self._publish_alerts()
+            self._publish_jobs()
+
+    def _publish_alerts(self):
+        rows = Log.query.filter(Log.id > self.last_log_id).order_by(Log.id).limit(POLL_BATCH).all()
+        for row in rows:
+            self.broadcaster.publish('alert', {'id': row.id, 'room_url': row.room_url, 'event_type': row.event_type,
+                                               'timestamp': row.timestamp.isoformat()}, key=row.room_url)
+            self.last_log_id = row.id
+
+    def _publish_jobs(self):
+        changed = Job.query.options(defer(Job.result)).filter(Job.updated_at >= self.last_job_update) \
+            .order_by(Job.updated_at).all()
+        for job in changed:
+            updated_at, classes, keywords, _ = self.seen.get(job.id, (None, set(), set(), False))
+            if job.updated_at == updated_at:
+                continue
+            gallery, flags = _split_result(job.kind, load_result(job))
+            for obj_class, metadata in gallery.items():
+                if obj_class not in classes:
+                    event = dict(metadata, video_filename=job.video_filename, job_id=job.id,
+                                 thumb_url=f"/uploads/thumbnails/{metadata['thumb_filename']}")
+                    event['class'] = obj_class
+                    self.broadcaster.publish('thumbnail', event, key=job.video_filename)
+            for keyword, flag in flags.items():
+                if keyword not in keywords:
+                    self.broadcaster.publish('audio_flag', dict(flag, keyword=keyword, video_filename=job.video_filename,
+                                                                job_id=job.id), key=job.video_filename)
+            self.broadcaster.publish('job', jobs.serialize_job(job), key=job.video_filename)
+            finished = job.status in ('done', 'failed', 'cancelled')
+            self.seen[job.id] = (job.updated_at, set(gallery), set(flags), finished)
+            self.last_job_update = max(self.last_job_update, job.updated_at)
+        # Finished jobs older than the cursor can no longer come back in the query
+        for job_id, (updated_at, _, _, finished) in list(self.seen.items()):
+            if finished and updated_at < self.last_job_update:
+                del self.seen[job_id]
+
+def _split_result(kind, result):
+    """Return (gallery, audio flags) from a job result of any kind."""
+    if kind == 'media':
+        return result.get('visual', {}).get('gallery', {}), result.get('audio', {})
+    if kind == 'visual':
+        return result.get('gallery', {}), {}
+    return {}, result
@@ -0,0 +1,228 @@
+import os
+import queue
+import subprocess
+import threading
+import time
+
+import numpy as np
+
+from detection import audio
+from detection.frames import DECODE_WIDTH, probe_size
+
+QUEUE_SIZE = int(os.environ.get('INGEST_QUEUE_SIZE', 16))  # Items buffered per consumer before the demuxer waits
+POLL = 0.5  # Seconds between stop checks while blocked on a queue
+
+def probe_streams(path):
+    """Return (has_video, has_audio, duration_seconds) for a media file."""
+    cmd = ["ffprobe", "-v", "error", "-show_entries", "stream=codec_type:format=duration", "-of", "csv=p=0", path]
+    output = subprocess.run(cmd, capture_output=True, text=True, timeout=60).stdout.split()
+    duration = 0.0
+    for value in output:
+        try:
+            duration = float(value)
+        except ValueError:
+            pass
+    return 'video' in output, 'audio' in output, duration
+
+class ConsumerStats:
+    """Progress and throughput of one consumer, in seconds of media."""
+
+    def __init__(self, duration):
+        self.duration = duration
+        self.items = 0
+        self.media_seconds = 0.0
+        self.busy_seconds = 0.0
+        self.producer_wait_seconds = 0.0  # Time the demuxer spent blocked on this consumer
+        self.max_queue = 0
+        self.started = time.monotonic()
+        self.done = False
+
+    def progress(self):
+        if self.done:
+            return 1.0
+        return min(self.media_seconds / self.duration, 1.0) if self.duration else 0.0
+
+    def to_dict(self):
+        elapsed = time.monotonic() - self.started
+        return {
+            'items': self.items,
+            'progress': round(self.progress(), 3),
+            'media_seconds': round(self.media_seconds, 2),
+            'realtime_factor': round(self.media_seconds / elapsed, 2) if elapsed else 0.0,
+            'busy_seconds': round(self.busy_seconds, 2),
+            'producer_wait_seconds': round(self.producer_wait_seconds, 2),
+            'max_queue': self.max_queue,
+        }
+
+class MediaIngest:
+    """Demuxes a media file once and fans sampled frames and 16 kHz PCM out to two consumers.
+
+    A single ffmpeg writes scaled BGR frames to stdout and PCM to a second pipe. Each output
+    has a reader thread feeding a bounded queue; when a consumer falls behind its queue fills,
+    the reader blocks, and ffmpeg stops decoding until it catches up. Frames are read into a
+    fixed set of buffers that the video consumer hands back after use."""
+
+    def __init__(self, path, sample_fps, width=DECODE_WIDTH, queue_size=QUEUE_SIZE):
+        self.path = path
+        self.sample_fps = sample_fps
+        self.has_video, self.has_audio, self.duration = probe_streams(path)
+        self.stop_event = threading.Event()
+        self.queue_size = queue_size
+        self.stats = {'video': ConsumerStats(self.duration), 'audio': ConsumerStats(self.duration)}
+        self.proc = None
+        if self.has_video:
+            source_width, source_height = probe_size(path)
+            self.width = min(width, source_width)
+            self.width -= self.width % 2
+            self.height = int(round(source_height * self.width / source_width / 2)) * 2
+            self.scale = source_width / self.width
+
+    def command(self, audio_fd):
+        cmd = ["ffmpeg", "-loglevel", "quiet", "-nostdin", "-i", self.path]
+        if self.has_video:
+            cmd += ["-map", "0:v:0", "-vf", f"fps={self.sample_fps},scale={self.width}:{self.height}",
+                    "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1"]
+        if self.has_audio:
+            cmd += ["-map", "0:a:0", "-ar", str(audio.SAMPLE_RATE), "-ac", "1", "-f", "s16le", f"pipe:{audio_fd}"]
+        return cmd
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _put(self, q, item, stats):
+        waited = time.monotonic()
+        while not self.stop_event.is_set():
+            try:
+                q.put(item, timeout=POLL)
+                stats.max_queue = max(stats.max_queue, q.qsize())
+                break
+            except queue.Full:
+                continue
+        stats.producer_wait_seconds += time.monotonic() - waited
+
+    def _get(self, q):
+        while True:
+            try:
+                return q.get(timeout=POLL)
+            except queue.Empty:
+                if self.stop_event.is_set():
+                    return None
+
+    def _read_video(self, stream, frames, free):
+        frame_size = self.width * self.height * 3
+        index = 0
+        try:
+            while not self.stop_event.is_set():
+                buffer = self._get(free)
+                if buffer is None:
+                    break
+                view = memoryview(buffer).cast('B')
+                filled = 0
+                while filled < frame_size:
+                    count = stream.readinto(view[filled:])
+                    if not count:
+                        break
+                    filled += count
+                if filled < frame_size:
+                    break
+                self._put(frames, (index / self.sample_fps, buffer), self.stats['video'])
+                index += 1
+        finally:
+            self._put(frames, None, self.stats['video'])
+
+    def _read_audio(self, stream, chunks):
+        offset = 0.0
+        try:
+            while not self.stop_event.is_set():
+                chunk = stream.read(audio.CHUNK_BYTES)
+                if not chunk:
+                    break
+                self._put(chunks, (offset, chunk), self.stats['audio'])
+                offset += len(chunk) / audio.BYTES_PER_SECOND
+        finally:
+            self._put(chunks, None, self.stats['audio'])
+
+    def _consume(self, name, q, consumer, release=None):
+        stats = self.stats[name]
+        step = 1.0 / self.sample_fps if name == 'video' else audio.CHUNK_BYTES / audio.BYTES_PER_SECOND
+        try:
+            while True:
+                item = self._get(q)
+                if item is None:
+                    break
+                timestamp, data = item
+                began = time.monotonic()
+                try:
+                    consumer(timestamp, data)
+                finally:
+                    if release:
+                        release(data)
+                stats.busy_seconds += time.monotonic() - began
+                stats.items += 1
+                stats.media_seconds = timestamp + step
+        except Exception:
+            self.stop()
+            raise
+        finally:
+            stats.done = not self.stop_event.is_set()
+
+    def run(self, on_frame, on_audio, on_progress=None):
+        """Decode once, calling on_frame(timestamp, frame) and on_audio(offset, pcm) on their own threads.
+
+        on_progress(metrics) is called about once a second from this thread and may call stop().
+        Frames are reused after on_frame returns. Returns the per-consumer metrics."""
+        audio_read, audio_write = os.pipe()
+        self.proc = subprocess.Popen(self.command(audio_write), stdout=subprocess.PIPE, pass_fds=(audio_write,))
+        os.close(audio_write)
+        audio_stream = os.fdopen(audio_read, 'rb')
+        threads = []
+        errors = []
+
+        def guarded(target, *args):
+            def run():
+                try:
+                    target(*args)
+                except Exception as e:
+                    errors.append(e)
+            thread = threading.Thread(target=run, daemon=True)
+            thread.start()
+            threads.append(thread)
+
+        if self.has_video:
+            frames = queue.Queue(maxsize=self.queue_size)
+            free = queue.Queue()
+            # Queued frames, one being filled and one being analysed
+            for _ in range(self.queue_size + 2):
+                free.put(np.empty((self.height, self.width, 3), dtype=np.uint8))
+            guarded(self._read_video, self.proc.stdout, frames, free)
+            guarded(self._consume, 'video', frames, on_frame, free.put)
+        else:
+            self.stats['video'].done = True
+        if self.has_audio:
+            chunks = queue.Queue(maxsize=self.queue_size * 8)
+            guarded(self._read_audio, audio_stream, chunks)
+            guarded(self._consume, 'audio', chunks, on_audio)
+        else:
+            self.stats['audio'].done = True
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=1.0)
+                    if thread.is_alive():
+                        break
+                if on_progress and not self.stop_event.is_set():
+                    on_progress(self.metrics())
+                if self.stop_event.is_set() and self.proc.poll() is None:
+                    self.proc.kill()
+        finally:
+            if self.proc.poll() is None:
+                self.proc.kill()
+            self.proc.stdout.close()
+            audio_stream.close()
+            self.proc.wait()
+        if errors:
+            raise errors[0]
+        return self.metrics()
+
+    def metrics(self):
+        return {name: stats.to_dict() for name, stats in self.stats.items()}
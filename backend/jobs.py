@@ -0,0 +1,117 @@
+import json
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import defer
+
+from models import db, Job
+from results_store import load_result
+
+JOB_STALE_AFTER = 300    # Seconds without a progress update before a running job is requeued
+PROGRESS_INTERVAL = 1.0  # Minimum seconds between progress writes for one job
+
+def enqueue(kind, video_filename, file_path):
+    job = Job(kind=kind, video_filename=video_filename, file_path=file_path)
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+def serialize_job(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'video_filename': job.video_filename,
+        'status': job.status,
+        'progress': job.progress,
+        'error': job.error,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'updated_at': job.updated_at.isoformat() if job.updated_at else None,
+    }
+
+def latest_result(video_filename, kind):
+    """Return (job, result dict) for the newest job of a kind on a video.
+
+    A 'media' job covers both kinds, so its result is unpacked to the requested part. The result
+    column is only read when the cached copy is out of date."""
+    job = Job.query.options(defer(Job.result)) \
+        .filter(Job.video_filename == video_filename, Job.kind.in_([kind, 'media'])) \
+        .order_by(Job.id.desc()).first()
+    if job is None:
+        return None, {}
+    result = load_result(job)
+    if job.kind == 'media':
+        result = result.get(kind, {})
+    return job, result
+
+def cancel(job):
+    """Cancel a queued job at once; ask a running one to stop at its next progress report."""
+    if job.status == 'queued':
+        job.status = 'cancelled'
+    elif job.status == 'running':
+        job.cancel_requested = True
+    job.updated_at = datetime.utcnow()
+    db.session.commit()
+
+def requeue_stale():
+    """Hand jobs from crashed workers back to the queue."""
+    cutoff = datetime.utcnow() - timedelta(seconds=JOB_STALE_AFTER)
+    Job.query.filter(Job.status == 'running', Job.updated_at < cutoff).update(
+        {'status': 'queued', 'worker': None}, synchronize_session=False)
+    db.session.commit()
+
+def requeue(job_id):
+    """Hand a running job straight back to the queue, for a worker that is being stopped."""
+    Job.query.filter_by(id=job_id, status='running').update(
+        {'status': 'queued', 'worker': None, 'updated_at': datetime.utcnow()}, synchronize_session=False)
+    db.session.commit()
+
+def claim_next(worker_id):
+    """Atomically move the oldest queued job to running for this worker, or return None."""
+    while True:
+        job = Job.query.filter_by(status='queued').order_by(Job.id).first()
+        if job is None:
+            return None
+        # Only one worker's conditional update can match while the job is still queued
+        claimed = Job.query.filter_by(id=job.id, status='queued').update(
+            {'status': 'running', 'worker': worker_id, 'updated_at': datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            db.session.refresh(job)
+            return job
+
+class ProgressReporter:
+    """Passed to job handlers as report(progress, result); returns False once the job was cancelled."""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.last_write = 0.0
+        self.cancelled = False
+
+    def __call__(self, progress, result):
+        now = time.monotonic()
+        if now - self.last_write < PROGRESS_INTERVAL:
+            return not self.cancelled
+        self.last_write = now
+        Job.query.filter_by(id=self.job_id).update(
+            {'progress': min(progress, 1.0), 'result': json.dumps(result), 'updated_at': datetime.utcnow()},
+            synchronize_session=False)
+        db.session.commit()
+        self.cancelled = db.session.query(Job.cancel_requested).filter_by(id=self.job_id).scalar()
+        return not self.cancelled
+
+def run_job(job, handlers):
+    """Run a claimed job with handlers[job.kind](file_path, video_filename, report) and store the outcome."""
+    report = ProgressReporter(job.id)
+    try:
+        result = handlers[job.kind](job.file_path, job.video_filename, report)
+    except Exception as e:
+        db.session.rollback()
+        Job.query.filter_by(id=job.id).update(
+            {'status': 'failed', 'error': str(e), 'updated_at': datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+        return
+    status = 'cancelled' if report.cancelled else 'done'
+    Job.query.filter_by(id=job.id).update(
+        {'status': status, 'progress': 1.0 if status == 'done' else Job.progress, 'result': json.dumps(result),
+         'updated_at': datetime.utcnow()}, synchronize_session=False)
+    db.session.commit()
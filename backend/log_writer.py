@@ -0,0 +1,105 @@
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from models import db, Log, LogRollup
+from periodic import PeriodicJob
+
+MAX_BUFFERED = 100000  # Rows kept in memory while the database is unavailable
+ROLLUP_BATCH = 10000   # Old Log rows compacted per transaction
+
+class LogWriter:
+    """Buffers Log rows from every stream and writes them with one bulk insert per flush.
+
+    A flush happens when flush_size rows are waiting or flush_interval seconds have passed,
+    so flush_interval is also the longest stretch of events a crash can lose."""
+
+    def __init__(self, app, flush_size=500, flush_interval=2.0):
+        self.app = app
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.stats = {'rows': 0, 'flushes': 0, 'errors': 0, 'dropped': 0}
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def write(self, room_url, event_type, timestamp=None):
+        row = {'room_url': room_url, 'event_type': event_type, 'timestamp': timestamp or datetime.utcnow()}
+        with self.lock:
+            if len(self.buffer) >= MAX_BUFFERED:
+                self.stats['dropped'] += 1
+                return
+            self.buffer.append(row)
+            full = len(self.buffer) >= self.flush_size
+        if full:
+            self.wakeup.set()
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                rows, self.buffer = self.buffer, []
+            if not rows:
+                return
+            try:
+                with self.app.app_context():
+                    db.session.execute(Log.__table__.insert(), rows)
+                    db.session.commit()
+            except Exception as e:
+                print(f"Log flush of {len(rows)} rows failed: {e}")
+                self.stats['errors'] += 1
+                # Put the rows back in front so they go out with the next flush
+                with self.lock:
+                    self.buffer = (rows + self.buffer)[:MAX_BUFFERED]
+                return
+            self.stats['rows'] += len(rows)
+            self.stats['flushes'] += 1
+
+    def _run(self):
+        while True:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.flush()
+
+def rollup_logs(cutoff):
+    """Compact Log rows older than cutoff into per-hour LogRollup counts and delete them.
+    Must run inside an app context; returns the number of Log rows removed."""
+    removed = 0
+    hour = func.strftime('%Y-%m-%d %H:00:00', Log.timestamp)
+    while True:
+        ids = db.session.query(Log.id).filter(Log.timestamp < cutoff).order_by(Log.id).limit(ROLLUP_BATCH).all()
+        if not ids:
+            return removed
+        batch = Log.query.filter(Log.timestamp < cutoff, Log.id <= ids[-1].id)
+        counts = batch.with_entities(hour, Log.room_url, Log.event_type, func.count(Log.id)).group_by(
+            hour, Log.room_url, Log.event_type).all()
+        for hour_str, room_url, event_type, count in counts:
+            hour_start = datetime.strptime(hour_str, '%Y-%m-%d %H:%M:%S')
+            rollup = LogRollup.query.filter_by(hour=hour_start, room_url=room_url, event_type=event_type).first()
+            if rollup:
+                rollup.count += count
+            else:
+                db.session.add(LogRollup(hour=hour_start, room_url=room_url, event_type=event_type, count=count))
+        removed += batch.delete(synchronize_session=False)
+        db.session.commit()
+
+class RetentionJob(PeriodicJob):
+    """Periodically rolls up Log rows older than retention_days."""
+
+    description = 'Log rollup'
+
+    def __init__(self, app, retention_days=30, interval=3600):
+        super().__init__(interval)
+        self.app = app
+        self.retention_days = retention_days
+
+    def run_once(self):
+        with self.app.app_context():
+            return rollup_logs(datetime.utcnow() - timedelta(days=self.retention_days))
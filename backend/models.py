@@ -1,4 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, inspect, text
 from datetime import datetime
 
 db = SQLAlchemy()
@@ -14,20 +15,39 @@ class Stream(db.Model):
     room_url = db.Column(db.String(300), unique=True, nullable=False)  # e.g., Chaturbate room URL
     platform = db.Column(db.String(50), default='Chaturbate')
     streamer_username = db.Column(db.String(100))  # parsed from room_url
+    conf_threshold = db.Column(db.Float)  # per-stream detection threshold; None uses the default
 
 class Assignment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    agent_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    stream_id = db.Column(db.Integer, db.ForeignKey('stream.id'), nullable=False)
+    agent_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    stream_id = db.Column(db.Integer, db.ForeignKey('stream.id'), nullable=False, index=True)
     user = db.relationship('User', backref='assignments')
     stream = db.relationship('Stream', backref='assignments')
 
 class Log(db.Model):
+    # Composite indexes match the /api/logs filters plus the (timestamp, id) keyset order
+    __table_args__ = (
+        db.Index('ix_log_timestamp_id', 'timestamp', 'id'),
+        db.Index('ix_log_room_timestamp_id', 'room_url', 'timestamp', 'id'),
+        db.Index('ix_log_event_timestamp_id', 'event_type', 'timestamp', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     room_url = db.Column(db.String(300))
     event_type = db.Column(db.String(50))
 
+class LogRollup(db.Model):
+    # Per-hour event counts that replace Log rows older than the retention period
+    __table_args__ = (
+        db.UniqueConstraint('hour', 'room_url', 'event_type'),
+        db.Index('ix_log_rollup_room_hour', 'room_url', 'hour'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    hour = db.Column(db.DateTime, nullable=False, index=True)
+    room_url = db.Column(db.String(300))
+    event_type = db.Column(db.String(50))
+    count = db.Column(db.Integer, nullable=False, default=0)
+
 class ChatKeyword(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     keyword = db.Column(db.String(100), unique=True, nullable=False)
@@ -35,3 +55,70 @@ class ChatKeyword(db.Model):
 class FlaggedObject(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     object_name = db.Column(db.String(100), unique=True, nullable=False)
+    conf_threshold = db.Column(db.Float)  # per-class detection threshold; None uses the stream/default
+
+class Job(db.Model):
+    # Detection work for an uploaded video, claimed and run by worker processes
+    __table_args__ = (
+        db.Index('ix_job_status_id', 'status', 'id'),
+        db.Index('ix_job_video_kind', 'video_filename', 'kind'),
+        db.Index('ix_job_updated_at', 'updated_at'),  # Change feed polled by the event stream
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # 'visual', 'audio' or 'media' (both from one decode)
+    video_filename = db.Column(db.String(300), nullable=False)
+    file_path = db.Column(db.String(500), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed, cancelled
+    progress = db.Column(db.Float, nullable=False, default=0.0)
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    result = db.Column(db.Text)  # JSON
+    error = db.Column(db.Text)
+    worker = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class RegistryVersion(db.Model):
+    # Single row bumped on every keyword / flagged-object write so other processes know to reload
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+def get_registry_version():
+    row = db.session.get(RegistryVersion, 1)
+    return row.version if row else 0
+
+def bump_registry_version():
+    """Increment the shared version in the current transaction; the caller commits."""
+    updated = RegistryVersion.query.filter_by(id=1).update({RegistryVersion.version: RegistryVersion.version + 1})
+    if not updated:
+        db.session.add(RegistryVersion(id=1, version=1))
+
+def upgrade_schema():
+    """Add columns and indexes introduced after a table was first created (db.create_all never alters tables)."""
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(db.engine.dialect)
+                db.session.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+    db.session.commit()
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+
+
+def configure_sqlite(engine, synchronous='NORMAL'):
+    """Use WAL so readers don't block the writer, and wait on locks instead of failing at once.
+    synchronous trades durability for commit latency: FULL syncs every commit, NORMAL only at checkpoints."""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute(f'PRAGMA synchronous={synchronous}')
+        cursor.execute('PRAGMA busy_timeout=30000')
+        cursor.close()
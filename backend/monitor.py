@@ -0,0 +1,157 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from periodic import PeriodicJob
+from scheduler import AdaptiveIntervals, POOL_SIZES, CPU_BUDGET
+
+MAX_CONCURRENT_CYCLES = 32  # Sampling cycles allowed in flight at once across all streams
+IO_WORKERS = 4              # Threads for blocking DB writes and notification calls
+
+def _timed(fn, stream_url):
+    started = time.monotonic()
+    result = fn(stream_url)
+    return result, time.monotonic() - started
+
+class AsyncMonitor:
+    """Samples every assigned stream from one asyncio loop instead of a thread per stream.
+
+    detectors maps an event type to a blocking fn(stream_url) that runs on its own bounded
+    executor. record_events(stream_url, [(event_type, result)]) persists a cycle's events and
+    notify(message, stream_url) hands one alert to the notification layer; both are treated as
+    blocking and are awaited on the I/O executor. on_remove(stream_url), if given, releases a
+    stream's capture and detector state once it is no longer watched."""
+
+    def __init__(self, detectors, record_events, notify, pool_sizes=None,
+                 max_concurrent=MAX_CONCURRENT_CYCLES, cpu_budget=CPU_BUDGET, on_remove=None):
+        pool_sizes = pool_sizes or POOL_SIZES
+        self.detectors = detectors
+        self.record_events = record_events
+        self.notify = notify
+        self.on_remove = on_remove
+        self.pool_sizes = pool_sizes
+        self.max_concurrent = max_concurrent
+        self.intervals = AdaptiveIntervals(cpu_budget * sum(pool_sizes[name] for name in detectors))
+        self.pools = {}
+        self.io_pool = None
+        self.loop = None
+        self.thread = None
+        self.semaphore = None
+        self.tasks = {}
+        self.in_flight = 0
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.pools = {name: ThreadPoolExecutor(max_workers=self.pool_sizes[name], thread_name_prefix=f'{name}-detector')
+                      for name in self.detectors}
+        self.io_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix='monitor-io')
+        self.loop = asyncio.new_event_loop()
+        self.semaphore = asyncio.Semaphore(self.max_concurrent)
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def set_streams(self, urls):
+        """Start watching new URLs and stop and release the ones that are no longer listed.
+
+        Returns once removed streams are released, which waits for their in-flight detector calls."""
+        asyncio.run_coroutine_threadsafe(self._set_streams(set(urls)), self.loop).result()
+
+    def stop(self, timeout=10):
+        if self.thread is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._set_streams(set()), self.loop).result(timeout)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout)
+            for pool in list(self.pools.values()) + [self.io_pool]:
+                pool.shutdown(wait=False)
+            self.thread = None
+
+    def stats(self):
+        stats = self.intervals.stats()
+        stats['in_flight'] = self.in_flight
+        return stats
+
+    async def _set_streams(self, urls):
+        removed = {}
+        for url in list(self.tasks):
+            if url not in urls:
+                removed[url] = self.tasks.pop(url)
+                removed[url].cancel()
+                self.intervals.remove(url)
+        for url in urls:
+            if url not in self.tasks:
+                self.tasks[url] = asyncio.ensure_future(self._watch(self.intervals.add(url)))
+        # Release only after the watchers have exited, or a detector still running would recreate what was freed
+        await asyncio.gather(*removed.values(), return_exceptions=True)
+        if self.on_remove:
+            for url in removed:
+                try:
+                    await self.loop.run_in_executor(self.io_pool, self.on_remove, url)
+                except Exception as e:
+                    print(f"Releasing {url} failed: {e}")
+
+    async def _watch(self, state):
+        while True:
+            async with self.semaphore:
+                self.in_flight += 1
+                try:
+                    events, cost = await self._sample(state.url)
+                    await self._publish(state.url, events)
+                finally:
+                    self.in_flight -= 1
+            await asyncio.sleep(self.intervals.update(state, len(events), cost))
+
+    async def _sample(self, stream_url):
+        names = list(self.detectors)
+        futures = [self.pools[name].submit(_timed, self.detectors[name], stream_url) for name in names]
+        try:
+            outcomes = await asyncio.gather(*[asyncio.wrap_future(f) for f in futures], return_exceptions=True)
+        except asyncio.CancelledError:
+            # Detector threads can't be interrupted; wait for them so a removal sees them finished
+            await asyncio.wait([asyncio.wrap_future(f) for f in futures])
+            raise
+        events = []
+        cost = 0.0
+        for name, outcome in zip(names, outcomes):
+            if isinstance(outcome, Exception):
+                print(f"{name} detector failed on {stream_url}: {outcome}")
+                continue
+            result, seconds = outcome
+            cost += seconds
+            if result:
+                events.append((name, result))
+        return events, cost
+
+    async def _publish(self, stream_url, events):
+        if not events:
+            return
+        try:
+            await self.loop.run_in_executor(self.io_pool, self.record_events, stream_url, events)
+        except Exception as e:
+            print(f"Recording events for {stream_url} failed: {e}")
+        await asyncio.gather(
+            *[self.loop.run_in_executor(self.io_pool, self.notify,
+                                        f"{event_type} alert on {stream_url}: {result}", stream_url)
+              for event_type, result in events],
+            return_exceptions=True
+        )
+
+class StreamSync(PeriodicJob):
+    """Keeps a monitor's streams in line with the database by polling list_urls() every interval.
+
+    Polling means a process that only serves the API (RUN_DETECTION=0) needs no channel to the
+    monitor process; a process running both calls trigger() after a write to apply it at once."""
+
+    description = 'Stream sync'
+
+    def __init__(self, monitor, list_urls, interval):
+        super().__init__(interval)
+        self.monitor = monitor
+        self.list_urls = list_urls
+
+    def run_once(self):
+        self.monitor.set_streams(self.list_urls())
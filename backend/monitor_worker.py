@@ -0,0 +1,14 @@
+"""Run stream monitoring without serving the HTTP API.
+
+Pair with API workers started with RUN_DETECTION=0 so only this process loads the models:
+    PRELOAD_MODELS=1 python monitor_worker.py
+"""
+import time
+
+from app import app, start_monitoring
+
+if __name__ == '__main__':
+    with app.app_context():
+        start_monitoring()
+    while True:
+        time.sleep(3600)
@@ -1,39 +1,233 @@
+import os
+import queue
 import smtplib
+import threading
+import time
 import requests
 
+# Endpoints are configurable so a local stand-in server can replace the real services
+TELEGRAM_API_URL = os.environ.get('TELEGRAM_API_URL', 'https://api.telegram.org')
+TELEGRAM_TOKEN = os.environ.get('TELEGRAM_TOKEN', '8175749575:AAGWrWMrqzQkDP8bkKe3gafC42r_Ridr0gY')
+TELEGRAM_CHAT_ID = os.environ.get('TELEGRAM_CHAT_ID', '8175749575')
+SMTP_HOST = os.environ.get('SMTP_HOST', 'smtp.example.com')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', 587))
+SMTP_STARTTLS = os.environ.get('SMTP_STARTTLS', '1') == '1'
+SMTP_USERNAME = os.environ.get('SMTP_USERNAME', 'your_email@example.com')
+SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD', 'your_password')
+EMAIL_FROM = os.environ.get('EMAIL_FROM', 'your_email@example.com')
+EMAIL_TO = os.environ.get('EMAIL_TO', 'recipient@example.com')
+
+COALESCE_WINDOW = float(os.environ.get('NOTIFY_COALESCE_WINDOW', 30))  # Seconds alerts for one room are merged over
+QUEUE_SIZE = 10000   # Alerts waiting to be coalesced; beyond this new alerts are dropped
+MAX_RETRIES = 3      # Attempts per channel after the first failure
+RETRY_BACKOFF = 2.0  # Seconds before the first retry, doubled each time
+RATE_LIMITS = {'telegram': 20, 'whatsapp': 20, 'email': 10}  # Messages per minute per channel
+
+_http = requests.Session()
+
 def send_telegram(message):
-    token = '8175749575:AAGWrWMrqzQkDP8bkKe3gafC42r_Ridr0gY'
-    chat_id = '8175749575'
-    url = f'https://api.telegram.org/bot{token}/sendMessage'
-    data = {'chat_id': chat_id, 'text': message}
-    requests.post(url, data=data)
+    url = f'{TELEGRAM_API_URL}/bot{TELEGRAM_TOKEN}/sendMessage'
+    data = {'chat_id': TELEGRAM_CHAT_ID, 'text': message}
+    response = _http.post(url, data=data, timeout=10)
+    response.raise_for_status()
+    return response.json()
 
 def send_whatsapp(message):
     # Placeholder for WhatsApp API integration (e.g., Twilio)
     pass
 
+class EmailSender:
+    """Keeps one SMTP connection open between alerts and reconnects when the server drops it."""
+
+    def __init__(self):
+        self.server = None
+
+    def _connect(self):
+        server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30)
+        if SMTP_STARTTLS:
+            server.starttls()
+        if SMTP_USERNAME:
+            server.login(SMTP_USERNAME, SMTP_PASSWORD)
+        return server
+
+    def _connected(self):
+        if self.server is None:
+            return False
+        try:
+            return self.server.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+
+    def send(self, message):
+        email_message = f"Subject: Stream Alert\n\n{message}"
+        if not self._connected():
+            self.close()
+            self.server = self._connect()
+        try:
+            self.server.sendmail(EMAIL_FROM, EMAIL_TO, email_message)
+        except (smtplib.SMTPServerDisconnected, OSError):
+            self.close()
+            raise
+
+    def close(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.server = None
+
+_email_sender = EmailSender()
+
 def send_email(message):
-    smtp_server = 'smtp.example.com'
-    smtp_port = 587
-    username = 'your_email@example.com'
-    password = 'your_password'
-    from_addr = 'your_email@example.com'
-    to_addr = 'recipient@example.com'
-    subject = 'Stream Alert'
-    email_message = f"Subject: {subject}\n\n{message}"
-    
-    server = smtplib.SMTP(smtp_server, smtp_port)
-    server.starttls()
-    server.login(username, password)
-    server.sendmail(from_addr, to_addr, email_message)
-    server.quit()
-
-def send_notification(message):
-    send_telegram(message)
-    send_whatsapp(message)
-    send_email(message)
+    _email_sender.send(message)
+
+class RateLimiter:
+    """Token bucket allowing `per_minute` sends, with bursts up to the same amount."""
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            time.sleep((1 - self.tokens) / self.rate)
+
+class ChannelWorker:
+    """Delivers messages for one channel on its own thread, so a slow channel only delays itself."""
+
+    def __init__(self, name, send):
+        self.name = name
+        self.send = send
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.limiter = RateLimiter(RATE_LIMITS.get(name, 20))
+        self.stats = {'sent': 0, 'failed': 0, 'retries': 0}
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            self.stats['failed'] += 1
+
+    def _run(self):
+        while True:
+            message = self.queue.get()
+            self.limiter.acquire()
+            delay = RETRY_BACKOFF
+            for attempt in range(MAX_RETRIES + 1):
+                try:
+                    self.send(message)
+                    self.stats['sent'] += 1
+                    break
+                except Exception as e:
+                    if attempt == MAX_RETRIES:
+                        print(f"{self.name} notification failed: {e}")
+                        self.stats['failed'] += 1
+                        break
+                    self.stats['retries'] += 1
+                    time.sleep(delay)
+                    delay *= 2
+
+class NotificationDispatcher:
+    """Queues alerts and fans them out to channels, coalescing bursts per room.
+
+    The first alert for a quiet room is sent at once and opens a window; follow-ups within it
+    are deduplicated and sent as one message when it closes. A room that is still busy gets a
+    new window, so a sustained burst costs one message per window."""
+
+    def __init__(self, channels, window=COALESCE_WINDOW):
+        self.window = window
+        self.workers = [ChannelWorker(name, send) for name, send in channels.items()]
+        self.incoming = queue.Queue(maxsize=QUEUE_SIZE)
+        self.pending = {}  # room -> (window opened, [held messages], messages already seen in the window)
+        self.dropped = 0
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, message, room=None):
+        """Enqueue an alert and return immediately."""
+        try:
+            self.incoming.put_nowait((room, message))
+        except queue.Full:
+            self.dropped += 1
+
+    def stats(self):
+        return {
+            'pending_rooms': len(self.pending),
+            'dropped': self.dropped,
+            'channels': {worker.name: dict(worker.stats) for worker in self.workers},
+        }
+
+    def _run(self):
+        while True:
+            timeout = None
+            if self.pending:
+                oldest = min(opened for opened, _, _ in self.pending.values())
+                timeout = max(0.0, oldest + self.window - time.monotonic())
+            try:
+                room, message = self.incoming.get(timeout=timeout)
+                self._add(room, message)
+            except queue.Empty:
+                pass
+            self._flush_due()
+
+    def _add(self, room, message):
+        entry = self.pending.get(room)
+        if entry is None:
+            self._deliver(room, [message])
+            self.pending[room] = (time.monotonic(), [], {message})
+            return
+        _, messages, seen = entry
+        if message not in seen:
+            seen.add(message)
+            messages.append(message)
+
+    def _flush_due(self):
+        now = time.monotonic()
+        for room, (opened, messages, _) in list(self.pending.items()):
+            if now - opened < self.window:
+                continue
+            if messages:
+                self._deliver(room, messages)
+                self.pending[room] = (now, [], set(messages))
+            else:
+                del self.pending[room]
+
+    def _deliver(self, room, messages):
+        if len(messages) == 1:
+            text = messages[0]
+        else:
+            header = f"{len(messages)} alerts on {room}:" if room else f"{len(messages)} alerts:"
+            text = "\n".join([header] + messages)
+        for worker in self.workers:
+            worker.put(text)
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+def get_dispatcher():
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = NotificationDispatcher({
+                'telegram': send_telegram,
+                'whatsapp': send_whatsapp,
+                'email': send_email,
+            })
+        return _dispatcher
+
+def send_notification(message, room=None):
+    get_dispatcher().submit(message, room)
 
 if __name__ == "__main__":
     test_message = "Test: Hello from your Telegram bot!"
-    result = send_test_telegram_message(test_message)
+    result = send_telegram(test_message)
     print("Telegram API Response:", result)
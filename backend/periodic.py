@@ -0,0 +1,43 @@
+import threading
+
+class PeriodicJob:
+    """Calls run_once() on a daemon thread at start and then every interval seconds until stop().
+
+    Subclasses implement run_once; an exception is printed and the job simply runs again at the
+    next interval. trigger() starts the next run early."""
+
+    description = 'Periodic job'  # Names the job in error messages
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.thread = None
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.wakeup = threading.Event()
+
+    def start(self):
+        # Request threads may race to start a job on first use
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wakeup.set()
+
+    def trigger(self):
+        """Run again now instead of at the end of the current interval; a no-op until started."""
+        self.wakeup.set()
+
+    def run_once(self):
+        raise NotImplementedError
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"{self.description} failed: {e}")
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
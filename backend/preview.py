@@ -0,0 +1,150 @@
+import os
+import threading
+import time
+
+import cv2
+
+from detection import tracker, visual
+
+PREVIEW_FPS = float(os.environ.get('PREVIEW_FPS', 15))           # Frames sent to viewers per second
+PREVIEW_DETECT_FPS = float(os.environ.get('PREVIEW_DETECT_FPS', 2))  # Inferences per second; boxes are reused in between
+PREVIEW_JPEG_QUALITY = int(os.environ.get('PREVIEW_JPEG_QUALITY', 70))
+PREVIEW_IDLE_TIMEOUT = 5.0  # Seconds a producer keeps running after its last viewer left
+
+class PreviewBroadcaster:
+    """One annotated MJPEG producer for a video file, shared by every viewer.
+
+    The producer plays the file in a loop at PREVIEW_FPS, runs detection only at
+    PREVIEW_DETECT_FPS and carries tracked boxes forward on the frames in between, and encodes
+    each frame once. Viewers just wait for the next encoded frame; when the last one has
+    gone for PREVIEW_IDLE_TIMEOUT the producer stops."""
+
+    def __init__(self, video_path, class_thresholds=None, on_stop=None):
+        self.video_path = video_path
+        self.class_thresholds = class_thresholds or (lambda: None)
+        self.on_stop = on_stop
+        self.condition = threading.Condition()
+        self.sequence = 0
+        self.jpeg = None
+        self.subscribers = 0
+        self.idle_since = None
+        self.running = False
+        self.stats = {'frames': 0, 'inferences': 0}
+
+    def subscribe(self):
+        with self.condition:
+            self.subscribers += 1
+            self.idle_since = None
+            if not self.running:
+                self.running = True
+                threading.Thread(target=self._run, daemon=True).start()
+
+    def unsubscribe(self):
+        with self.condition:
+            self.subscribers -= 1
+            if self.subscribers <= 0:
+                self.idle_since = time.monotonic()
+
+    def frames(self):
+        """Yield encoded JPEG frames for one viewer until the producer stops or the viewer disconnects."""
+        self.subscribe()
+        try:
+            sequence = 0
+            while True:
+                with self.condition:
+                    self.condition.wait_for(lambda: self.sequence != sequence or not self.running, timeout=5.0)
+                    if not self.running:
+                        return
+                    if self.sequence == sequence:
+                        continue
+                    sequence, jpeg = self.sequence, self.jpeg
+                yield jpeg
+        finally:
+            # Runs when the server closes the generator after the client went away
+            self.unsubscribe()
+
+    def _idle(self):
+        with self.condition:
+            return (self.subscribers <= 0 and self.idle_since is not None
+                    and time.monotonic() - self.idle_since > PREVIEW_IDLE_TIMEOUT)
+
+    def _run(self):
+        cap = cv2.VideoCapture(self.video_path)
+        went_idle = False
+        try:
+            if not cap.isOpened():
+                return
+            fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+            # Skip source frames so we only decode what viewers are sent
+            skip = max(1, int(round(fps / PREVIEW_FPS)))
+            frame_interval = skip / fps
+            detect_every = max(1, int(round(fps / skip / PREVIEW_DETECT_FPS)))
+            encode_params = [cv2.IMWRITE_JPEG_QUALITY, PREVIEW_JPEG_QUALITY]
+            tracks = tracker.IouTracker(max_finished=0)
+            index = 0
+            next_frame = time.monotonic()
+            while not self._idle():
+                for _ in range(skip - 1):
+                    cap.grab()
+                ret, frame = cap.read()
+                if not ret:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    if index == 0:
+                        return
+                    index = 0
+                    tracks = tracker.IouTracker(max_finished=0)
+                    continue
+                # Position in the file, so carried-forward boxes move at the video's own speed
+                timestamp = cap.get(cv2.CAP_PROP_POS_FRAMES) / fps
+                if index % detect_every == 0:
+                    tracks.update(visual.detect_objects(frame, None, self.class_thresholds()).to_list(), timestamp)
+                    self.stats['inferences'] += 1
+                index += 1
+                ret, buffer = cv2.imencode('.jpg', visual.draw_tracks(frame, tracks.predict(timestamp)), encode_params)
+                if ret:
+                    with self.condition:
+                        self.jpeg = buffer.tobytes()
+                        self.sequence += 1
+                        self.condition.notify_all()
+                    self.stats['frames'] += 1
+                next_frame += frame_interval
+                delay = next_frame - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_frame = time.monotonic()  # Fell behind; don't try to catch up in a burst
+            went_idle = True
+        finally:
+            cap.release()
+            with self.condition:
+                # A viewer who arrived while we were deciding to stop gets a fresh producer
+                restart = went_idle and self.subscribers > 0
+                if restart:
+                    threading.Thread(target=self._run, daemon=True).start()
+                else:
+                    self.running = False
+                self.condition.notify_all()
+            if self.on_stop and not restart:
+                self.on_stop(self)
+
+# One broadcaster per video file
+_broadcasters = {}
+_broadcasters_lock = threading.Lock()
+
+def _remove(broadcaster):
+    with _broadcasters_lock, broadcaster.condition:
+        # A viewer may have restarted it in the meantime
+        if not broadcaster.running and _broadcasters.get(broadcaster.video_path) is broadcaster:
+            del _broadcasters[broadcaster.video_path]
+
+def get_broadcaster(video_path, class_thresholds=None):
+    with _broadcasters_lock:
+        broadcaster = _broadcasters.get(video_path)
+        if broadcaster is None:
+            broadcaster = PreviewBroadcaster(video_path, class_thresholds, on_stop=_remove)
+            _broadcasters[video_path] = broadcaster
+        return broadcaster
+
+def get_stats():
+    with _broadcasters_lock:
+        return {os.path.basename(path): dict(b.stats, subscribers=b.subscribers) for path, b in _broadcasters.items()}
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import cv2
+
+from models import db, Job
+from periodic import PeriodicJob
+
+RESULT_CACHE_BYTES = int(os.environ.get('RESULT_CACHE_BYTES', 64 * 1024 * 1024))  # Hot tier size, as JSON bytes
+RESULTS_RETENTION_DAYS = int(os.environ.get('RESULTS_RETENTION_DAYS', 30))
+THUMBNAIL_QUEUE_SIZE = 256   # Pending thumbnail writes before detection threads wait
+THUMBNAIL_QUALITY = 85
+THUMBNAIL_GRACE = 3600       # Unreferenced thumbnails younger than this are kept; their job may still be running
+FINISHED_STATUSES = ('done', 'failed', 'cancelled')
+
+class ResultCache:
+    """Memory-bounded LRU of parsed job results in front of the Job table (the cold tier).
+
+    Entries are keyed by job id and checked against the row's updated_at, so a poll only
+    reads the small columns unless the job has moved on since it was cached."""
+
+    def __init__(self, max_bytes=RESULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # job id -> (updated_at, result, size)
+        self.size = 0
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, job_id, updated_at):
+        with self.lock:
+            entry = self.entries.get(job_id)
+            if entry is None or entry[0] != updated_at:
+                self.stats['misses'] += 1
+                return None
+            self.entries.move_to_end(job_id)
+            self.stats['hits'] += 1
+            return entry[1]
+
+    def put(self, job_id, updated_at, result, size):
+        with self.lock:
+            old = self.entries.pop(job_id, None)
+            if old:
+                self.size -= old[2]
+            if size > self.max_bytes:
+                return
+            self.entries[job_id] = (updated_at, result, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, _, evicted_size) = self.entries.popitem(last=False)
+                self.size -= evicted_size
+                self.stats['evictions'] += 1
+
+    def discard(self, job_id):
+        with self.lock:
+            old = self.entries.pop(job_id, None)
+            if old:
+                self.size -= old[2]
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, entries=len(self.entries), bytes=self.size)
+
+cache = ResultCache()
+
+def load_result(job):
+    """Parsed result of a Job row, from the hot tier when it is current."""
+    result = cache.get(job.id, job.updated_at)
+    if result is None:
+        text = db.session.query(Job.result).filter_by(id=job.id).scalar()
+        result = json.loads(text) if text else {}
+        cache.put(job.id, job.updated_at, result, len(text or ''))
+    return result
+
+class ThumbnailWriter:
+    """Encodes and writes thumbnails on a background thread.
+
+    Names are content addressed, <first two hex digits>/<sha1 of the pixels>.jpg, so callers
+    get the name immediately and identical crops are stored once."""
+
+    def __init__(self, queue_size=THUMBNAIL_QUEUE_SIZE):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = None
+        self.lock = threading.Lock()
+        self.stats = {'written': 0, 'deduplicated': 0, 'failed': 0}
+
+    def submit(self, folder, image):
+        """Queue image for writing under folder and return its relative filename."""
+        digest = hashlib.sha1(image.tobytes()).hexdigest()
+        filename = f"{digest[:2]}/{digest}.jpg"
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+        # A full queue blocks the caller, which bounds the memory held by pending crops
+        self.queue.put((os.path.join(folder, filename), image))
+        return filename
+
+    def flush(self):
+        """Wait until everything submitted so far is on disk."""
+        self.queue.join()
+
+    def _run(self):
+        while True:
+            path, image = self.queue.get()
+            try:
+                try:
+                    # Touch an existing copy so retention's grace period also covers the job now naming it
+                    os.utime(path)
+                    self.stats['deduplicated'] += 1
+                    continue
+                except FileNotFoundError:
+                    pass
+                ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_QUALITY])
+                if not ok:
+                    self.stats['failed'] += 1
+                    continue
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Write then rename so readers never see a half-written file
+                temporary = f"{path}.{threading.get_ident()}.tmp"
+                with open(temporary, 'wb') as f:
+                    f.write(buffer.tobytes())
+                os.replace(temporary, path)
+                self.stats['written'] += 1
+            except OSError as e:
+                self.stats['failed'] += 1
+                print(f"Writing thumbnail {path} failed: {e}")
+            finally:
+                self.queue.task_done()
+
+thumbnails = ThumbnailWriter()
+
+def purge_results(cutoff, thumbnails_folder):
+    """Delete finished jobs last updated before cutoff, then thumbnails no remaining job refers to.
+    Must run inside an app context; returns (jobs removed, thumbnails removed)."""
+    old = Job.query.filter(Job.status.in_(FINISHED_STATUSES), Job.updated_at < cutoff)
+    ids = [job_id for job_id, in old.with_entities(Job.id).all()]
+    removed_jobs = old.delete(synchronize_session=False)
+    db.session.commit()
+    for job_id in ids:
+        cache.discard(job_id)
+
+    referenced = set()
+    for text, in db.session.query(Job.result).filter(Job.result.isnot(None)).yield_per(100):
+        result = json.loads(text)
+        galleries = [result.get('gallery')] + [part.get('gallery') for part in result.values() if isinstance(part, dict)]
+        for gallery in galleries:
+            for metadata in (gallery or {}).values():
+                if isinstance(metadata, dict) and 'thumb_filename' in metadata:
+                    referenced.add(os.path.normpath(metadata['thumb_filename']))
+    removed_thumbnails = 0
+    now = time.time()
+    for directory, _, filenames in os.walk(thumbnails_folder):
+        for name in filenames:
+            path = os.path.join(directory, name)
+            relative = os.path.normpath(os.path.relpath(path, thumbnails_folder))
+            try:
+                if relative not in referenced and now - os.path.getmtime(path) > THUMBNAIL_GRACE:
+                    os.remove(path)
+                    removed_thumbnails += 1
+            except OSError:
+                pass
+    return removed_jobs, removed_thumbnails
+
+class ResultsRetentionJob(PeriodicJob):
+    """Periodically removes job results older than retention_days and their orphaned thumbnails."""
+
+    description = 'Results retention'
+
+    def __init__(self, app, thumbnails_folder, retention_days=RESULTS_RETENTION_DAYS, interval=3600):
+        super().__init__(interval)
+        self.app = app
+        self.thumbnails_folder = thumbnails_folder
+        self.retention_days = retention_days
+
+    def run_once(self):
+        with self.app.app_context():
+            return purge_results(datetime.utcnow() - timedelta(days=self.retention_days), self.thumbnails_folder)
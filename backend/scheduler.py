@@ -0,0 +1,69 @@
+DEFAULT_INTERVAL = 10.0  # Seconds between samples for a newly added stream
+MIN_INTERVAL = 2.0       # Busiest rooms are never sampled more often than this
+MAX_INTERVAL = 60.0      # Quiet rooms back off to at most this
+QUIET_BACKOFF = 1.25     # Interval multiplier after a cycle without alerts
+ACTIVITY_DECAY = 0.8     # How quickly past alerts stop counting as recent activity
+COST_SMOOTHING = 0.3     # Weight of the newest measurement in the per-stream cost average
+CPU_BUDGET = 0.75        # Share of the worker pools' capacity the monitors may keep busy
+POOL_SIZES = {'visual': 4, 'audio': 2, 'chat': 2}
+
+class StreamState:
+    def __init__(self, url):
+        self.url = url
+        self.interval = DEFAULT_INTERVAL
+        self.activity = 0.0  # decaying count of recent alerts
+        self.cost = 0.0      # average detector seconds per cycle
+
+    def load(self):
+        return self.cost / self.interval
+
+class AdaptiveIntervals:
+    """Picks each stream's sampling interval from recent alerts, detector cost and a global CPU budget.
+
+    capacity is the number of detector worker threads the monitors may keep busy; the summed
+    cost/interval of all streams is kept at or below it by stretching intervals."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.streams = {}
+        self.total_load = 0.0
+
+    def add(self, url):
+        state = self.streams.get(url)
+        if state is None:
+            state = StreamState(url)
+            self.streams[url] = state
+        return state
+
+    def remove(self, url):
+        state = self.streams.pop(url, None)
+        if state:
+            self.total_load -= state.load()
+
+    def update(self, state, alerts, cost):
+        """Record one finished cycle and return the delay before the stream's next one."""
+        self.total_load -= state.load()
+        state.cost = cost if not state.cost else (1 - COST_SMOOTHING) * state.cost + COST_SMOOTHING * cost
+        state.activity = state.activity * ACTIVITY_DECAY + alerts
+        if alerts:
+            interval = state.interval / (1 + alerts)
+        elif state.activity < 0.5:
+            interval = state.interval * QUIET_BACKOFF
+        else:
+            interval = state.interval
+        # Stretch the interval once the pools would be over budget
+        projected = self.total_load + state.cost / max(interval, MIN_INTERVAL)
+        if projected > self.capacity:
+            interval *= projected / self.capacity
+        state.interval = min(max(interval, MIN_INTERVAL), MAX_INTERVAL)
+        if state.url in self.streams:
+            self.total_load += state.load()
+        return state.interval
+
+    def stats(self):
+        return {
+            'streams': len(self.streams),
+            'load': self.total_load,
+            'capacity': self.capacity,
+            'intervals': {url: state.interval for url, state in dict(self.streams).items()},
+        }
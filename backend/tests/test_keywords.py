@@ -0,0 +1,45 @@
+import os
+import sys
+
+# Import the matcher module directly so the tests don't load the detection models
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'detection'))
+from keywords import KeywordMatcher
+
+def test_matches_whole_words_only():
+    matcher = KeywordMatcher(['gun'])
+    assert matcher.search('he has a gun!') == {'gun'}
+    assert matcher.search('the show has begun') == set()
+    assert matcher.search('gunfire') == set()
+
+def test_overlapping_keywords():
+    matcher = KeywordMatcher(['she', 'he', 'hers', 'his'])
+    assert matcher.search('ushers') == set()
+    assert matcher.find_all('she said hers') == [('she', 0, 3), ('hers', 9, 13)]
+    assert matcher.find_all('he') == [('he', 0, 2)]
+
+def test_case_insensitive_and_keeps_original_keyword():
+    matcher = KeywordMatcher(['Gun', 'gun', ' knife '])
+    assert len(matcher) == 2
+    assert matcher.find_all('GUN and Knife') == [('Gun', 0, 3), ('knife', 8, 13)]
+
+def test_punctuation_edged_keywords_are_bounded_on_word_edges_only():
+    matcher = KeywordMatcher(['#ad', 'c++', '$$$'])
+    assert matcher.search('this is an #ad') == {'#ad'}
+    assert matcher.search('this is an #adult show') == set()
+    assert matcher.search('x#ad') == {'#ad'}
+    assert matcher.search('i write c++.') == {'c++'}
+    assert matcher.search('abc++') == set()
+    assert matcher.search('win$$$now') == {'$$$'}
+
+def test_offsets_survive_characters_that_lowercase_longer():
+    text = 'İstanbul gun'
+    assert 'İ'.lower() != 'i'  # Two code points: the offsets would shift without length-preserving folding
+    matcher = KeywordMatcher(['gun', 'İSTANBUL'])
+    matches = matcher.find_all(text)
+    assert matches == [('İSTANBUL', 0, 8), ('gun', 9, 12)]
+    assert [text[start:end] for _, start, end in matches] == ['İstanbul', 'gun']
+
+def test_every_match_slices_back_to_the_keyword():
+    text = 'İİ Gun, gUN; begun guns ĞUN gun'
+    for keyword, start, end in KeywordMatcher(['gun', 'ğun']).find_all(text):
+        assert text[start:end].lower() == keyword
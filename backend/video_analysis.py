@@ -0,0 +1,211 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import cv2
+
+from detection import backends, visual, motion, tracker
+from detection.frames import FFmpegFrameSource, ffmpeg_available
+from results_store import thumbnails
+
+SAMPLE_FPS = float(os.environ.get('ANALYSIS_SAMPLE_FPS', 1.0))   # Frames analysed per second of video
+SEGMENT_SECONDS = float(os.environ.get('ANALYSIS_SEGMENT_SECONDS', 120))
+ANALYSIS_PROCESSES = int(os.environ.get('ANALYSIS_PROCESSES', max(1, (os.cpu_count() or 2) // 2)))
+# Detector threads per segment process; with the defaults, two job workers' pools together use one thread per core
+SEGMENT_THREADS = int(os.environ.get('ANALYSIS_SEGMENT_THREADS', 1))
+USE_FFMPEG_DECODE = os.environ.get('ANALYSIS_FFMPEG_DECODE', '1') != '0'
+SEEK_MIN_STEP = 60  # Seek instead of grabbing through frames when samples are at least this far apart
+HEARTBEAT_INTERVAL = 30  # Seconds between progress reports while segments run; well under jobs.JOB_STALE_AFTER
+
+def video_info(video_path):
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError('Could not open video file')
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return fps, total_frames
+
+def _record_detections(frame, detections, thumbnails_folder, video_timestamp, gallery, timeline, tracks, scale=1.0):
+    """Add one sampled frame's detections; boxes are scaled back to source-resolution coordinates."""
+    for track_id, det in tracks.update(detections, video_timestamp):
+        timeline.append({
+            "time": round(video_timestamp, 3),
+            "track_id": track_id,
+            "class": det['class'],
+            "confidence": det['confidence'],
+            "box": [int(round(v * scale)) for v in det['box']]
+        })
+        if det['class'] in gallery:
+            continue
+        x1, y1, x2, y2 = det['box']
+        cropped = frame[y1:y2, x1:x2]
+        if cropped.size == 0:
+            continue
+        # Encoding and disk I/O happen on the writer thread, not in the detection loop
+        thumb_filename = thumbnails.submit(thumbnails_folder, cv2.resize(cropped, (100, 100)))
+        gallery[det['class']] = {
+            "thumb_filename": thumb_filename,
+            "video_timestamp": video_timestamp,
+            "realworld_timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+        }
+
+def _analyze_segment_ffmpeg(video_path, thumbnails_folder, start_frame, end_frame, step, fps, on_frame):
+    gate = motion.MotionGate()
+    tracks = tracker.IouTracker()
+    gallery = {}
+    timeline = []
+    duration = None if end_frame == float('inf') else (end_frame - start_frame) / fps
+    source = FFmpegFrameSource(video_path, sample_fps=fps / step, start_seconds=start_frame / fps, duration=duration)
+    for video_timestamp, frame in source:
+        frame_index = int(round(video_timestamp * fps))
+        if frame_index >= end_frame:
+            break
+        detections = gate.run(frame, visual.extract_detections)
+        _record_detections(frame, detections, thumbnails_folder, video_timestamp, gallery, timeline, tracks, source.scale)
+        if on_frame and not on_frame(video_timestamp):
+            break
+    return {"start_frame": start_frame, "gallery": gallery, "timeline": timeline, "tracks": tracks.intervals()}
+
+def _analyze_segment_opencv(video_path, thumbnails_folder, start_frame, end_frame, step, fps, on_frame):
+    cap = cv2.VideoCapture(video_path)
+    gate = motion.MotionGate()
+    tracks = tracker.IouTracker()
+    gallery = {}
+    timeline = []
+    seek = step >= SEEK_MIN_STEP
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    position = start_frame
+    frame_index = start_frame
+    while frame_index < end_frame:
+        if seek:
+            if position != frame_index:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+                position = frame_index
+        else:
+            # grab() skips colour conversion and copying for the frames we don't analyse
+            while position < frame_index and cap.grab():
+                position += 1
+        ret, frame = cap.read()
+        if not ret:
+            break
+        position += 1
+        detections = gate.run(frame, visual.extract_detections)
+        _record_detections(frame, detections, thumbnails_folder, frame_index / fps, gallery, timeline, tracks)
+        if on_frame and not on_frame(frame_index / fps):
+            break
+        frame_index += step
+    cap.release()
+    return {"start_frame": start_frame, "gallery": gallery, "timeline": timeline, "tracks": tracks.intervals()}
+
+def _init_segment_process(threads):
+    # Runs before the model loads; by default every process would use all cores
+    backends.DETECTOR_THREADS = threads
+
+def analyze_segment(video_path, thumbnails_folder, start_frame, end_frame, step, on_frame=None):
+    """Sample frames [start_frame, end_frame) every `step` frames; returns the segment's gallery and timeline.
+
+    With ffmpeg installed only the sampled frames are decoded, already downscaled for YOLO;
+    otherwise OpenCV decodes at full resolution. on_frame(video_timestamp), when given, is called
+    after each sampled frame; returning False stops the segment early."""
+    fps, _ = video_info(video_path)
+    if USE_FFMPEG_DECODE and ffmpeg_available():
+        segment = _analyze_segment_ffmpeg(video_path, thumbnails_folder, start_frame, end_frame, step, fps, on_frame)
+    else:
+        segment = _analyze_segment_opencv(video_path, thumbnails_folder, start_frame, end_frame, step, fps, on_frame)
+    # The gallery must not name thumbnails that are still only in the writer's queue
+    thumbnails.flush()
+    return segment
+
+class FrameAnalyzer:
+    """Collects the gallery and timeline from frames pushed in by a shared decode (see ingest.py)."""
+
+    def __init__(self, thumbnails_folder):
+        os.makedirs(thumbnails_folder, exist_ok=True)
+        self.thumbnails_folder = thumbnails_folder
+        self.gate = motion.MotionGate()
+        self.tracks = tracker.IouTracker()
+        self.gallery = {}
+        self.timeline = []
+
+    def add(self, video_timestamp, frame, scale=1.0):
+        detections = self.gate.run(frame, visual.extract_detections)
+        _record_detections(frame, detections, self.thumbnails_folder, video_timestamp, self.gallery, self.timeline,
+                           self.tracks, scale)
+
+    def finish(self):
+        """Wait for pending thumbnails and return the final result."""
+        thumbnails.flush()
+        return self.result()
+
+    def result(self):
+        return {"gallery": dict(self.gallery), "timeline": list(self.timeline), "tracks": self.tracks.intervals()}
+
+def merge_segments(segments):
+    """Combine segment results into one gallery (earliest thumbnail per class), one sorted timeline
+    and one list of object intervals. Track IDs are renumbered so they stay unique across segments."""
+    gallery = {}
+    timeline = []
+    tracks = []
+    id_offset = 0
+    for segment in sorted(segments, key=lambda s: s["start_frame"]):
+        timeline.extend(dict(entry, track_id=entry["track_id"] + id_offset) for entry in segment["timeline"])
+        segment_tracks = [dict(interval, track_id=interval["track_id"] + id_offset) for interval in segment["tracks"]]
+        tracks.extend(segment_tracks)
+        id_offset = max([id_offset] + [interval["track_id"] for interval in segment_tracks])
+        for obj_class, metadata in segment["gallery"].items():
+            # Thumbnails of later segments that lose here are removed by results retention
+            if obj_class not in gallery:
+                gallery[obj_class] = metadata
+    return {"gallery": gallery, "timeline": timeline, "tracks": tracks}
+
+def analyze_video(video_path, thumbnails_folder, report, sample_fps=SAMPLE_FPS):
+    """Analyse the whole video, splitting it into time segments processed in parallel.
+
+    report(progress, result) is called as segments finish and as a heartbeat while they run, so
+    long or unknown-length videos are not requeued as stale; returning False cancels the rest."""
+    os.makedirs(thumbnails_folder, exist_ok=True)
+    fps, total_frames = video_info(video_path)
+    step = max(1, int(round(fps / sample_fps)))
+    segment_frames = max(step, int(SEGMENT_SECONDS * fps) // step * step)
+    if total_frames > 0:
+        bounds = [(start, min(start + segment_frames, total_frames)) for start in range(0, total_frames, segment_frames)]
+    else:
+        # Unknown length: read one segment until the decoder runs out
+        bounds = [(0, float('inf'))]
+    if len(bounds) <= 1 or ANALYSIS_PROCESSES <= 1:
+        segments = []
+        merged = merge_segments(segments)
+        for start, end in bounds:
+            def on_frame(video_timestamp, start=start, end=end):
+                # Progress within an unknown-length segment stays at zero; the write still refreshes updated_at
+                within = max(0.0, min(1.0, (video_timestamp * fps - start) / (end - start)))
+                return report((len(segments) + within) / len(bounds), merged)
+            segments.append(analyze_segment(video_path, thumbnails_folder, start, end, step, on_frame))
+            merged = merge_segments(segments)
+            if not report(len(segments) / len(bounds), merged):
+                break
+        return merged
+
+    segments = []
+    context = multiprocessing.get_context('spawn')
+    existing = set(multiprocessing.active_children())
+    executor = ProcessPoolExecutor(max_workers=min(ANALYSIS_PROCESSES, len(bounds)), mp_context=context,
+                                   initializer=_init_segment_process, initargs=(SEGMENT_THREADS,))
+    pending = set()
+    try:
+        pending = {executor.submit(analyze_segment, video_path, thumbnails_folder, start, end, step)
+                   for start, end in bounds}
+        while pending:
+            done, pending = wait(pending, timeout=HEARTBEAT_INTERVAL, return_when=FIRST_COMPLETED)
+            segments.extend(future.result() for future in done)
+            if not report(len(segments) / len(bounds), merge_segments(segments)):
+                break
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        if pending:
+            # Cancelled or failed: segments still running would decode and infer for a finished job
+            for process in set(multiprocessing.active_children()) - existing:
+                process.terminate()
+    return merge_segments(segments)
@@ -0,0 +1,94 @@
+"""Detection worker processes: claim jobs from the database queue and run them.
+
+    python worker.py --processes 4
+
+Any number of these can run on any machine sharing the database and the uploads folder.
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+
+POLL_INTERVAL = 1.0         # Seconds an idle worker waits before checking the queue again
+STALE_CHECK_INTERVAL = 60   # Seconds between an idle worker's sweeps for jobs whose worker died
+SUPERVISE_INTERVAL = 5.0    # Seconds between the parent's checks for workers that exited
+STOP_TIMEOUT = 10           # Seconds a worker gets to exit before it is killed
+
+def _exit(signum, frame):
+    # Raise SystemExit so finally blocks and context managers run
+    sys.exit(0)
+
+def run_worker(worker_id):
+    signal.signal(signal.SIGTERM, _exit)
+    from app import app, JOB_HANDLERS
+    from models import db
+    import jobs
+    with app.app_context():
+        last_stale_check = 0.0
+        while True:
+            # Jobs of a worker that was killed mid-job stay 'running' until someone sweeps them
+            if time.monotonic() - last_stale_check >= STALE_CHECK_INTERVAL:
+                jobs.requeue_stale()
+                last_stale_check = time.monotonic()
+            job = jobs.claim_next(worker_id)
+            if job is None:
+                time.sleep(POLL_INTERVAL)
+                continue
+            print(f"[{worker_id}] running {job.kind} job {job.id} for {job.video_filename}")
+            try:
+                jobs.run_job(job, JOB_HANDLERS)
+            except (SystemExit, KeyboardInterrupt):
+                # Stop the job's segment processes and give it back now rather than after JOB_STALE_AFTER
+                for child in multiprocessing.active_children():
+                    child.terminate()
+                db.session.rollback()
+                jobs.requeue(job.id)
+                raise
+
+def start_pool(processes):
+    """Start detection worker processes; each loads its own models.
+
+    Workers are not daemonic: visual jobs run their segments in a process pool of their own,
+    and daemonic processes may not have children. Call stop_pool to shut them down."""
+    return [start_worker(i) for i in range(processes)]
+
+def start_worker(index):
+    worker_id = f"{socket.gethostname()}-{os.getpid()}-{index}"
+    process = multiprocessing.get_context('spawn').Process(target=run_worker, args=(worker_id,))
+    process.start()
+    return process
+
+def supervise(pool):
+    """Replace workers that exit, e.g. after being OOM-killed, so the pool keeps its size; runs until interrupted."""
+    while True:
+        time.sleep(SUPERVISE_INTERVAL)
+        for i, process in enumerate(pool):
+            if not process.is_alive():
+                print(f"Worker {i} exited with code {process.exitcode}; restarting it")
+                pool[i] = start_worker(i)
+
+def stop_pool(pool, timeout=STOP_TIMEOUT):
+    """Terminate the workers and wait for them; each requeues the job it was running.
+    A worker that has to be killed leaves its job to be requeued once it goes stale."""
+    for process in pool:
+        if process.is_alive():
+            process.terminate()
+    for process in pool:
+        process.join(timeout)
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--processes', type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    args = parser.parse_args()
+    signal.signal(signal.SIGTERM, _exit)
+    pool = start_pool(args.processes)
+    try:
+        supervise(pool)
+    finally:
+        stop_pool(pool)